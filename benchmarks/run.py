@@ -0,0 +1,333 @@
+"""
+Benchmarks for loading, processing, validating, rendering and saving
+templates at realistic sizes.
+
+    PYTHONPATH=src python benchmarks/run.py --rows 1000 10000 --json results.json
+
+Synthetic TEMPLATE_V3 workbooks are generated in a temporary directory. Every
+step reports wall time, rows per second and, with --memory, the peak memory
+allocated by python while the step ran.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import openpyxl
+
+from many_more_routes.io import save_excel
+from many_more_routes.models import ValidatedTemplate
+
+from making_routes.cli import HeadlessInterface
+from making_routes.excel import excel_rows
+from making_routes.export import FORMATS, save_views
+from making_routes.records import template_record
+from making_routes.store import CompactRecords
+from making_routes.workspace import Workspace, save_workspace
+from making_routes import validation
+
+from making_routes.plugins.core import MakeRoutePlugin
+from making_routes.plugins.core import MakeCustomerExtensionExtendedPlugin
+from making_routes.plugins.core import MakeCustomerExtensionPlugin
+from making_routes.plugins.core import MakeDeparturePlugin
+from making_routes.plugins.core import MakeSelectionPlugin
+from making_routes.plugins.core import ValidatePlugin
+from making_routes.plugins.core import assign_routes
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+INVALID_EVERY = 50
+
+
+def synthetic_row(n: int) -> Dict:
+    letters = ''.join(chr(65 + (n // 26 ** k) % 26) for k in range(4))
+    return {
+        'ROUT': f'SE{n % 10000:04d}' if n % INVALID_EVERY else 'INVALID',
+        'EDEL': 'GOT',
+        'EDEU': letters[:3],
+        'MODL': '10',
+        'RODN': None,
+        'DDOW': '1010100',
+        'FWNO': f'{n % 10000000:07d}',
+        'ARDY': 1 + n % 10,
+        'TSID': 'TRCK',
+        'RRSP': 'M3GENUSR',
+        'DRSP': 'M3GENUSR',
+        'CMNT': f'Synthetic row {n}',
+    }
+
+
+def write_template(path: Path, rows: int) -> None:
+    """Write a TEMPLATE_V3 workbook with the same layout as save_template."""
+    headers = list(ValidatedTemplate.schema()['properties'].keys())
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('TEMPLATE_V3')
+    sheet.append(headers)
+    sheet.append(headers)
+    sheet.append(['yes'] * len(headers))
+    for n in range(rows):
+        row = synthetic_row(n)
+        sheet.append([row.get(header) for header in headers])
+
+    workbook.save(str(path))
+
+
+class Bench:
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.results: List[Dict] = []
+
+    def run(self, name: str, rows: int, function: Callable[[], Optional[int]]) -> None:
+        if self.memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        count = function()
+        seconds = time.perf_counter() - start
+
+        peak = None
+        if self.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        count = rows if count is None else count
+        result = {
+            'name': name,
+            'rows': rows,
+            'records': count,
+            'seconds': seconds,
+            'records_per_second': count / seconds if seconds else None,
+            'peak_bytes': peak,
+        }
+        self.results.append(result)
+
+        memory = f'{peak / 2 ** 20:>9.1f} MiB' if peak is not None else ''
+        print(f'{name:<40} {rows:>8} {count:>9} {seconds:>9.3f} s {result["records_per_second"] or 0:>12.0f}/s {memory}')
+
+
+def bench_headless(bench: Bench, path: Path, rows: int, output: Path) -> HeadlessInterface:
+    interface = HeadlessInterface()
+    make_plugins = [
+        MakeRoutePlugin(interface),
+        MakeDeparturePlugin(interface),
+        MakeSelectionPlugin(interface),
+        MakeCustomerExtensionPlugin(interface),
+        MakeCustomerExtensionExtendedPlugin(interface),
+    ]
+    validate_plugin = ValidatePlugin(interface)
+
+    def load():
+        count, records = excel_rows(path, 'TEMPLATE_V3')
+        interface.append_records(map(template_record, records))
+
+    validation.cache.clear()
+    bench.run('load_and_validate', rows, load)
+
+    for plugin in make_plugins:
+        def make(plugin=plugin):
+            before = sum(interface.mvc.counts().values())
+            plugin.main()
+            return sum(interface.mvc.counts().values()) - before
+
+        bench.run(f'make:{plugin.make_function.__name__}', rows, make)
+
+    def validate():
+        validate_plugin.main()
+        return sum(len(records) for records in interface.mvc.views.values())
+
+    validation.cache.clear()
+    bench.run('validate_plugin_cold', rows, validate)
+    bench.run('validate_plugin_warm', rows, validate)
+
+    def assign():
+        routes = [None] * rows
+        assigned = assign_routes(routes, 'AA0000', interface.list_values('ROUT', None))
+        return len(assigned)
+
+    bench.run('assign_routes', rows, assign)
+
+    def save():
+        records = [record for view in interface.mvc.views.values() for record in view]
+        save_excel(records, str(output))
+        return len(records)
+
+    bench.run('save_excel', rows, save)
+
+    for suffix in FORMATS:
+        def export(suffix=suffix):
+            save_views(interface.mvc.views, str(output.with_name(f'export_{rows}{suffix}')))
+            return sum(len(records) for records in interface.mvc.views.values())
+
+        bench.run(f'save_views:{suffix}', rows, export)
+
+    workspace = output.with_name(f'workspace_{rows}.mrws')
+
+    def save_snapshot():
+        save_workspace(interface.mvc.views, interface.mvc.protected, workspace)
+        return sum(len(records) for records in interface.mvc.views.values())
+
+    def load_snapshot():
+        with Workspace(workspace) as opened:
+            return sum(len(opened.load(name)) for name in opened.names)
+
+    bench.run('save_workspace', rows, save_snapshot)
+    bench.run('load_workspace', rows, load_snapshot)
+
+    return interface
+
+
+def bench_storage(bench: Bench, interface: HeadlessInterface, rows: int) -> None:
+    """Memory kept per row by a list of pydantic records and by CompactRecords.
+    Field values are shared, only the per row overhead is measured."""
+    for api, records in interface.mvc.views.items():
+        sizes = {}
+        for name, store in (('list', lambda: [type(r).construct(**r.__dict__) for r in records]), ('compact', lambda: CompactRecords(records))):
+            tracemalloc.start()
+            kept = store()
+            sizes[name] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del kept
+
+        count = max(len(records), 1)
+        result = {
+            'name': f'storage:{api}',
+            'rows': rows,
+            'records': len(records),
+            'list_bytes_per_record': sizes['list'] / count,
+            'compact_bytes_per_record': sizes['compact'] / count,
+        }
+        bench.results.append(result)
+
+        ratio = sizes['list'] / sizes['compact'] if sizes['compact'] else 0
+        print(f'{result["name"]:<40} {rows:>8} {len(records):>9} {result["list_bytes_per_record"]:>9.0f} B list {result["compact_bytes_per_record"]:>9.0f} B compact {ratio:>5.1f}x')
+
+    template = max(len(interface.mvc.views.get('TEMPLATE_V3', ())), 1)
+    provenance = sum(
+        counts.buffer_info()[1] * counts.itemsize
+        for plugin in interface.list_plugins() if getattr(plugin, 'provenance', None) is not None
+        for counts in plugin.provenance.counts.values()
+    )
+    bench.results.append({'name': 'storage:provenance', 'rows': rows, 'bytes_per_template_row': provenance / template})
+    print(f'{"storage:provenance":<40} {rows:>8} {template:>9} {provenance / template:>9.0f} B per template row')
+
+
+def bench_qt(bench: Bench, interface: HeadlessInterface, rows: int) -> None:
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    try:
+        from PySide6.QtCore import Qt
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        print('PySide6 not available, skipping model and view benchmarks', file=sys.stderr)
+        return
+
+    from making_routes.models import LazyRecordView, OutputRecordModel, OutputRecordView
+
+    app = QApplication.instance() or QApplication([])
+    records = interface.mvc.views['TEMPLATE_V3']
+
+    model = OutputRecordModel(records)
+    columns = model.columnCount()
+    cells = min(rows, 10000)
+
+    def data(model=model):
+        for row in range(min(model.rowCount(), cells)):
+            for column in range(columns):
+                model.data(model.index(row, column))
+        return min(model.rowCount(), cells) * columns
+
+    def header_data():
+        for _ in range(cells):
+            for column in range(columns):
+                model.headerData(column, Qt.Horizontal)
+        return cells * columns
+
+    bench.run('model.data', rows, data)
+    bench.run('model.data:compact', rows, lambda: data(OutputRecordModel(records, compact=True)))
+    bench.run('model.headerData', rows, header_data)
+
+    def search():
+        model.set_filter('ROUT', 'SE0042')
+        model.set_filter('ROUT', 'SE00', prefix=True)
+        model.sort(0)
+        model.set_filter(None)
+        model.sort(-1)
+
+    bench.run('model.search_and_sort', rows, search)
+
+    def append():
+        view = OutputRecordView(records[:1])
+        for record in records[1:cells]:
+            view.append(record)
+        return cells
+
+    def append_records():
+        view = OutputRecordView(records[:1])
+        view.append_records(records[1:])
+
+    bench.run('view.append', rows, append)
+    bench.run('view.append_records', rows, append_records)
+
+    def paste():
+        view = OutputRecordView(records, editable=True)
+        count = min(len(records), cells // 5)
+        view.setCurrentIndex(view.model.index(0, 0))
+        view.paste('\n'.join(f'SE{row:04d}\t1\t1\t1\t1' for row in range(count)))
+        return count * 5
+
+    bench.run('view.paste', rows, paste)
+
+    def views(view_type):
+        outputs = [records for records in interface.mvc.views.values() if len(records)]
+        for records in outputs:
+            view_type(records, compact=True)
+        return len(outputs)
+
+    bench.run('views:table', rows, lambda: views(OutputRecordView))
+    bench.run('views:lazy', rows, lambda: views(LazyRecordView))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='template sizes to benchmark')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--memory', action='store_true', help='measure peak memory, slows down every step')
+    parser.add_argument('--no-qt', action='store_true', help='skip the model and view benchmarks')
+    args = parser.parse_args(argv)
+
+    bench = Bench(memory=args.memory)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            path = Path(directory) / f'template_{rows}.xlsx'
+
+            start = time.perf_counter()
+            write_template(path, rows)
+            print(f'generated {rows} rows in {time.perf_counter() - start:.3f} s')
+
+            interface = bench_headless(bench, path, rows, Path(directory) / f'output_{rows}.xlsx')
+            bench_storage(bench, interface, rows)
+
+            if not args.no_qt:
+                bench_qt(bench, interface, rows)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': bench.results,
+            }, file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
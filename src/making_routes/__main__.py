@@ -1,4 +1,12 @@
-from making_routes.app import main
+import sys
+import time
+
+started = time.perf_counter()
 
 if __name__ == '__main__':
-    main()
+    if sys.argv[1:2] == ['process']:
+        from making_routes.cli import main
+        sys.exit(main(sys.argv[2:]))
+
+    from making_routes.app import main
+    main(started)
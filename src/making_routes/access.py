@@ -0,0 +1,86 @@
+"""
+Read-only access to the records of views for plugins. A RecordSequence reads
+the storage of a view in place, so scanning a view or a slice of it does
+not copy the records, and a RecordRows chains several views. Records are
+changed through the interface, not through these objects.
+"""
+from collections.abc import Sequence as SequenceABC
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from many_more_routes.ducks import OutputRecord
+
+from .store import CompactRecords, field_values
+
+
+class RecordSequence(SequenceABC):
+    """Read-only sequence over the records of a view, or over a range of
+    them. Slicing returns another RecordSequence over the same storage.
+    Positions are relative to the slice, row() gives the position in the
+    view. Storage returns the current storage of the view, which is read
+    when the records are accessed, so a sequence over the whole view also
+    has the records added since it was made."""
+    def __init__(self, api: str, storage: Callable[[], Sequence[OutputRecord]], rows: Optional[range] = None):
+        self.api = api
+        self._storage = storage
+        self._range = rows
+
+    @property
+    def _rows(self) -> range:
+        return range(len(self._storage())) if self._range is None else self._range
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[OutputRecord, 'RecordSequence']:
+        if isinstance(index, slice):
+            return RecordSequence(self.api, self._storage, self._rows[index])
+
+        return self._storage()[self._rows[index]]
+
+    def __iter__(self) -> Iterator[OutputRecord]:
+        storage = self._storage()
+        rows = range(len(storage)) if self._range is None else self._range
+        return map(storage.__getitem__, rows)
+
+    def __repr__(self) -> str:
+        return f'RecordSequence({self.api!r}, rows={self._rows.start}:{self._rows.stop}:{self._rows.step})'
+
+    def row(self, index: int) -> int:
+        """Position in the view of the record at an index."""
+        return self._rows[index]
+
+    def rows(self) -> Iterator[Tuple[int, OutputRecord]]:
+        """(position in the view, record) pairs."""
+        return zip(self._rows, self)
+
+    def values(self, name: str) -> List[Any]:
+        """A field of every record, None where a record has no such field.
+        Compact storage is read without making records."""
+        storage = self._storage()
+        if self._range is None:
+            return field_values(storage, name)
+
+        if isinstance(storage, CompactRecords):
+            def value(row: int) -> Any:
+                try:
+                    return storage.value(row, name)
+                except AttributeError:
+                    return None
+
+            return [value(row) for row in self._range]
+
+        return field_values(self, name)
+
+
+class RecordRows:
+    """(position in the view, record) pairs of several views, one view
+    after the other."""
+    def __init__(self, views: Iterable[RecordSequence]):
+        self.views = list(views)
+
+    def __len__(self) -> int:
+        return sum(len(view) for view in self.views)
+
+    def __iter__(self) -> Iterator[Tuple[int, OutputRecord]]:
+        for view in self.views:
+            yield from view.rows()
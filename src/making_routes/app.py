@@ -1,17 +1,20 @@
 """
 Configure routes for M3
+
+Modules that are slow to import, like the excel libraries and package
+metadata, are imported when first used so the window shows quickly.
 """
 import sys
+import time
 
-try:
-    from importlib import metadata as importlib_metadata
-except ImportError:
-    # Backwards compatibility - importlib.metadata was added in Python 3.8
-    import importlib_metadata
+from contextlib import ExitStack
 
-from typing import List, Dict, ForwardRef, Optional, Any, Tuple, Set, Literal, Union
+from typing import Callable, List, Dict, ForwardRef, Optional, Any, Iterable, Sequence, Tuple, Set, Literal, Union
 
+from PySide6.QtCore import QStandardPaths
+from PySide6.QtCore import QTimer
 from PySide6.QtGui import QAction
+from PySide6.QtGui import QKeySequence
 from PySide6.QtWidgets import QStyle
 from PySide6.QtWidgets import QApplication
 from PySide6.QtWidgets import QMainWindow
@@ -20,44 +23,102 @@ from PySide6.QtWidgets import QStatusBar
 from PySide6.QtWidgets import QToolBar
 from PySide6.QtWidgets import QFileDialog
 from PySide6.QtWidgets import QInputDialog
+from PySide6.QtWidgets import QLineEdit
 from PySide6.QtWidgets import QMessageBox
+from PySide6.QtWidgets import QProgressBar
+from PySide6.QtWidgets import QPushButton
 
 from many_more_routes.ducks import OutputRecord
 from many_more_routes.models import UnvalidatedTemplate
 from many_more_routes.models import ValidatedTemplate
 
-from many_more_routes.io import load_excel
-from many_more_routes.io import save_excel
-from many_more_routes.io import save_template
-
 from making_routes.models import OutputRecordView
-from making_routes.plugin import Plugin, PluginInterfaceBase
+from making_routes.plugin import Button, Plugin, PluginInterfaceBase, Trigger
+
+from .excel import excel_rows
+from .dedup import Deduplicator
+from .engine import TriggerEngine
+from .export import export_format, save_views
+from .jobs import Job, JobRunner
+from .models import LazyRecordView, OutputRecordModel, OutputRecordView
+from .profiling import Profiler, StartupTimer
+from .registry import PluginRegistry
+from .records import template_record
+from .report import REPORT_API, ErrorReport, Issue, split_replacements
+from .access import RecordRows, RecordSequence
+from .store import Replacements, field_values, group_replacements, snapshot
+from .workspace import SUFFIX as WORKSPACE_SUFFIX
+from .workspace import Workspace, WorkspaceError, save_workspace
 
-from pydantic.error_wrappers import ValidationError
 
-from .models import OutputRecordView
+MakingRoutes = ForwardRef('MakingRoutes')
 
-from .plugins.core import AssignRoutes
-from .plugins.core import MakeRoutePlugin
-from .plugins.core import MakeCustomerExtensionExtendedPlugin
-from .plugins.core import MakeCustomerExtensionPlugin
-from .plugins.core import MakeDeparturePlugin
-from .plugins.core import MakeSelectionPlugin
-from .plugins.core import ValidatePlugin
+SAVE_FILTERS = {
+    'Template (*.xlsx)': '.xlsx',
+    'CSV per API (*.csv)': '.csv',
+    'Columnar JSON (*.json.gz)': '.json.gz',
+}
 
-MakingRoutes = ForwardRef('MakingRoutes')
 
 class ModelViewController:
-    views: Dict[str, OutputRecordView] = {}
+    views: Dict[str, LazyRecordView]
     protected: Set[str]
+    report: ErrorReport
+    compact: bool = True
+    dedup: Optional[Deduplicator] = None
+
+    def __init__(self):
+        self.views = {}
+        self.protected = set()
+        self.report = ErrorReport()
 
     def append_record(self, record: OutputRecord) -> None:
-        try:
-            self.views[record._api].append(record)
+        self.append_records([record])
+
+    def append_records(self, records: Iterable[OutputRecord]) -> None:
+        if self.dedup is not None:
+            records = self.dedup.filter(records)
+
+        batches: Dict[str, List[OutputRecord]] = {}
+        issues = []
+        for record in records:
+            if isinstance(record, Issue):
+                issues.append(record)
+            else:
+                batches.setdefault(record._api, []).append(record)
+
+        self.report.add(issues)
+
+        for api, batch in batches.items():
+            try:
+                self.views[api].append_records(batch)
+
+            except KeyError:
+                self.views[api] = LazyRecordView(batch, compact=self.compact)
+
+    def replace_records(self, replacements: Replacements) -> None:
+        replacements, old, new = split_replacements(replacements)
+        self.report.replace(old, new)
+
+        # validation issues point at rows of the records being replaced
+        groups_by_api = group_replacements(replacements)
+        self.report.clear('VALIDATION_ERROR', groups_by_api.keys())
+
+        for api, groups in groups_by_api.items():
+            try:
+                self.views[api].replace_records(groups)
+
+            except KeyError:
+                records = [record for old, new in groups for record in new]
+                if records:
+                    self.views[api] = LazyRecordView(records, compact=self.compact)
 
-        except KeyError:
-            self.views[record._api] = OutputRecordView([record])
+    def set_view(self, name: str, records: Sequence[OutputRecord]) -> None:
+        """Replace the records of a view."""
+        if self.dedup is not None:
+            self.dedup.forget([name])
 
+        self.views[name] = LazyRecordView(records, compact=self.compact)
 
     def protect(self, name: str) -> None:
         if not name in self.views.keys():
@@ -65,7 +126,7 @@ class ModelViewController:
 
         self.protected.add(name)
 
-    def get_view(self, name: str) -> OutputRecordView:
+    def get_view(self, name: str) -> LazyRecordView:
         return self.views[name]
 
     def clear(self, force: bool = False):
@@ -74,18 +135,65 @@ class ModelViewController:
             for key in keys:
                 if key not in self.protected:
                     self.views.pop(key)
+                    if self.dedup is not None:
+                        self.dedup.forget([key])
         else:
             self.views = {}
             self.protected = set()
+            if self.dedup is not None:
+                self.dedup.clear()
+
+        self.report.clear()
+
+    def update_report(self) -> None:
+        """Replace the ERROR_REPORT view with a summary of the report."""
+        summary = self.report.summary()
+        if summary:
+            self.set_view(REPORT_API, summary)
+        else:
+            self.views.pop(REPORT_API, None)
 
 
 class PluginInterface(PluginInterfaceBase):
     def __init__(self, parent=QMainWindow, view: Optional[OutputRecordView] = None, errors: Optional[OutputRecordView] = None):
         self.parent = parent
         self.mvc = ModelViewController()
-        self.__plugins: Set[Plugin] = set()
-
-    def list_records(self, model: Union[int, str] = 0) -> List[UnvalidatedTemplate|ValidatedTemplate]:
+        self.job: Optional[Job] = None
+        self.processed: Optional[OutputRecordModel] = None
+        self.profiler = Profiler()
+        self.registry: Optional[PluginRegistry] = None
+        self.__plugins: List[Plugin] = []
+        self._dispatch: Optional[Dict[str, List[Tuple[str, Trigger]]]] = None
+        self.engine = TriggerEngine()
+
+    def load_plugins(self, cache: Optional[str] = None) -> None:
+        """Read the plugin manifest. With a cached manifest the plugins are
+        loaded when first used and only discovered by update_plugins,
+        otherwise all of them are loaded to write the manifest."""
+        self.registry = PluginRegistry(self, cache)
+        self._dispatch = None
+        self._report_plugin_errors()
+
+    def update_plugins(self) -> bool:
+        """Discover the plugins. Returns True when they have changed since
+        the manifest was cached, and the buttons should be listed again."""
+        if self.registry is None or not self.registry.update():
+            return False
+
+        self._dispatch = None
+        self._report_plugin_errors()
+        return True
+
+    def _report_plugin_errors(self) -> None:
+        if self.registry.errors:
+            self.prompt_error('Plugins that failed to load:\n' + '\n'.join(
+                f'{spec}: {error}' for spec, error in self.registry.errors.items()
+            ))
+
+    def _in_job(self) -> bool:
+        return self.job is not None and (self.job.is_current() or self.engine.in_task())
+
+    def _view_name(self, model: Union[int, str]) -> str:
         if isinstance(model, int):
             model = list(self.mvc.views.keys())[model]
 
@@ -93,28 +201,173 @@ class PluginInterface(PluginInterfaceBase):
             if model not in self.mvc.views.keys():
                 raise ValueError(f"Cannot find {model} in the MVC")
 
-        return self.mvc.views[model].list()
+        return model
+
+    def list_records(self, model: Union[int, str] = 0) -> List[UnvalidatedTemplate|ValidatedTemplate]:
+        return self.mvc.views[self._view_name(model)].list()
+
+    def records(self, model: Union[int, str] = 0) -> RecordSequence:
+        model = self._view_name(model)
+        return RecordSequence(model, self.mvc.views[model].get)
+
+    def record_rows(self, models: Union[str, Sequence[str], None] = None) -> RecordRows:
+        if models is None:
+            models = list(self.mvc.views.keys())
+        elif isinstance(models, str):
+            models = [models]
+
+        return RecordRows(self.records(model) for model in models)
 
     def update_record(self, index: int, record: UnvalidatedTemplate|ValidatedTemplate) -> None:
+        if self.engine.in_task():
+            return self.engine.defer(self.update_record, index, record)
+
         self.mvc.views[record._api].update(index, record)
 
+    def list_values(self, name: str, model: Union[int, str, None] = 0) -> List[Any]:
+        if model is None:
+            return [value for key in list(self.mvc.views.keys()) for value in self.list_values(name, key)]
+
+        if isinstance(model, int):
+            model = list(self.mvc.views.keys())[model]
+
+        if model not in self.mvc.views.keys():
+            raise ValueError(f"Cannot find {model} in the MVC")
+
+        return field_values(self.mvc.views[model].get(), name)
+
+    def update_values(self, name: str, values: Dict[int, Any], model: Union[int, str] = 0) -> None:
+        if isinstance(model, int):
+            model = list(self.mvc.views.keys())[model]
+
+        self.profiler.add(len(values))
+        if self.engine.in_task():
+            return self.engine.defer(self.mvc.views[model].update_values, name, values)
+
+        self.mvc.views[model].update_values(name, values)
+
     def append_record(self, record: OutputRecord) -> None:
-        self.mvc.append_record(record)
+        self.append_records([record])
+
+    def replace_records(self, replacements: Replacements) -> None:
+        if self.engine.in_task():
+            return self.engine.defer(self.replace_records, replacements)
+
+        self.mvc.replace_records(replacements)
+
+    def update_outputs(self) -> bool:
+        """Regenerate the outputs of the template rows edited since they were
+        last processed. Returns False if all outputs have to be rebuilt."""
+        view = self.mvc.views.get('TEMPLATE_V3')
+        if view is None or view.model is not self.processed:
+            return False
+
+        # Replaced outputs may be the kept copy of a duplicate of another row
+        if self.mvc.dedup is not None:
+            return False
+
+        if self.registry is not None and any(
+            entry.enabled and 'ON_PROCESS' in entry.events and not self.registry.is_loaded(entry)
+            for entry in self.registry.entries
+        ):
+            return False
+
+        plugins = [
+            plugin for plugin in filter(lambda x: x.enabled, self.list_plugins())
+            if any(trigger.event == 'ON_PROCESS' for trigger in plugin.triggers())
+        ]
+        if not all(hasattr(plugin, 'updatable') and plugin.updatable() for plugin in plugins):
+            return False
+
+        rows = sorted(view.model.take_dirty())
+        for plugin in plugins:
+            plugin.update(rows)
+
+        return True
+
+    def append_records(self, records: Iterable[OutputRecord]) -> None:
+        records = self.profiler.count(records)
+        if self.engine.in_task():
+            self.engine.defer(self._append_records, list(records))
+        else:
+            self._append_records(records)
+
+    def _append_records(self, records: Iterable[OutputRecord]) -> None:
+        if self._in_job():
+            self.job.append_records(records)
+        else:
+            self.mvc.append_records(records)
+
+    def clear_issues(self, kind: Optional[str] = None) -> None:
+        if self.engine.in_task():
+            return self.engine.defer(self.clear_issues, kind)
+
+        self.mvc.report.clear(kind)
+
+    def report_progress(self, current: int, total: int, message: str = '') -> None:
+        if self._in_job():
+            self.job.report_progress(current, total, message)
 
     def prompt_error(self, error_message: str):
-        QMessageBox.critical(self.parent, 'Error', error_message)
+        if self._in_job():
+            self.job.signals.error.emit(error_message)
+        else:
+            QMessageBox.critical(self.parent, 'Error', error_message)
 
     def prompt(self, header: str, message: str, text: Optional[str] = '') -> Tuple[Any, Any]:
         return QInputDialog.getText(self.parent, header, message, text=text)
 
     def register(self, plugin: Plugin) -> None:
-        self.__plugins.add(plugin)
+        if plugin not in self.__plugins:
+            self.__plugins.append(plugin)
+            self._dispatch = None
 
     def list_plugins(self) -> List[Plugin]:
+        """Plugins loaded so far."""
         return list(self.__plugins)
 
+    def list_buttons(self) -> List[Tuple[str, Button]]:
+        """Buttons of the enabled plugins with the name of their plugin.
+        Buttons of plugins that are not loaded load them when pressed."""
+        buttons = []
+        loaded = []
+        if self.registry is not None:
+            buttons = [(entry.name, button) for entry, button in self.registry.buttons()]
+            loaded = list(self.registry.loaded.values())
+
+        for plugin in filter(lambda x: x.enabled and x not in loaded, self.list_plugins()):
+            buttons.extend((type(plugin).__name__, button) for button in plugin.buttons())
+
+        return buttons
+
+    def _dispatch_table(self) -> Dict[str, List[Tuple[str, Trigger]]]:
+        """Triggers per event of the loaded plugins, in manifest order and
+        then in order of registration. Computed again only when a plugin is
+        loaded or registered."""
+        if self._dispatch is not None:
+            return self._dispatch
+
+        table: Dict[str, List[Tuple[str, Trigger]]] = {}
+        plugins = self.list_plugins()
+
+        if self.registry is not None:
+            loaded = list(self.registry.loaded.values())
+            plugins = [plugin for plugin in plugins if plugin not in loaded]
+
+            for entry in filter(lambda x: x.enabled, self.registry.entries):
+                if self.registry.is_loaded(entry):
+                    for trigger in self.registry.load(entry).triggers():
+                        table.setdefault(trigger.event, []).append((entry.name, trigger))
+
+        for plugin in filter(lambda x: x.enabled, plugins):
+            for trigger in plugin.triggers():
+                table.setdefault(trigger.event, []).append((type(plugin).__name__, trigger))
+
+        self._dispatch = table
+        return table
+
     def list_all_records(self):
-        return [(n, record) for key in self.mvc.views.keys() for n, record in enumerate(self.list_records(key))]
+        return list(self.record_rows())
 
     def trigger(self, event: Literal[
         'ON_LOAD',
@@ -122,10 +375,18 @@ class PluginInterface(PluginInterfaceBase):
         'ON_VALIDATE',
         'ON_PROCESS'
     ]):
-        for plugin in filter(lambda x: x.enabled, self.list_plugins()):
-            for trigger in plugin.triggers():
-                if trigger.event == event:
-                    trigger.callback()
+        self.profiler.new_run()
+        if self.registry is not None:
+            for entry in self.registry.entries:
+                if entry.enabled and event in entry.events:
+                    self.registry.load(entry)
+
+        # a cProfile only follows its own thread
+        self.engine.run(
+            self._dispatch_table().get(event, []),
+            self.profiler.measure,
+            workers=1 if self.profiler.capture else None
+        )
 
 
 class MakingRoutes(QMainWindow):
@@ -137,18 +398,18 @@ class MakingRoutes(QMainWindow):
         self.outputs = []
         self.sheetnames = []
         self.tables = {}
+        self._issue_positions: Dict[Tuple, int] = {}
 
-        interface = PluginInterface(self)
-        AssignRoutes(interface)
-        MakeRoutePlugin(interface)
-        MakeDeparturePlugin(interface)
-        MakeSelectionPlugin(interface)
-        MakeCustomerExtensionPlugin(interface)
-        MakeCustomerExtensionExtendedPlugin(interface)
-        ValidatePlugin(interface)
+        cache = QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)
 
+        interface = PluginInterface(self)
+        interface.load_plugins(f'{cache}/making-routes/plugins.json' if cache else None)
 
         self.interface = interface
+        self.runner = JobRunner(interface, self)
+        self.runner.progress.connect(self._job_progress)
+        self.runner.records.connect(self._job_records)
+        self.runner.error.connect(interface.prompt_error)
 
         self._init_toolbar()
         self._init_statusbar()
@@ -173,6 +434,7 @@ class MakingRoutes(QMainWindow):
         action1 = QAction("Open from File", self)
         action2 = QAction("Save to File", self)
         action4 = QAction("Update Outputs", self)
+        action6 = QAction("Rebuild Outputs", self)
         action5 = QAction("New template", self)
 
         action1.setIcon(icon1)
@@ -182,35 +444,135 @@ class MakingRoutes(QMainWindow):
         action1.triggered.connect(self._load_template_cb)
         action2.triggered.connect(self._save_tables_cb)
         action4.triggered.connect(self._process_template_cb)
+        action6.triggered.connect(self._rebuild_outputs_cb)
         action5.triggered.connect(self._new_template_cb)
 
         toolbar1.addAction(action5)
         toolbar1.addAction(action1)
         toolbar1.addAction(action2)
+
+        action9 = QAction("Open Workspace", self)
+        action9.triggered.connect(self._open_workspace_cb)
+        action10 = QAction("Save Workspace", self)
+        action10.triggered.connect(self._save_workspace_cb)
+
+        toolbar1.addAction(action9)
+        toolbar1.addAction(action10)
         toolbar1.addSeparator()
-        for plugin in filter(lambda x: x.enabled, self.interface.list_plugins()):
-            for button in plugin.buttons():
-                action = QAction(button.name, self)
-                action.triggered.connect(button.callback)
-                action.triggered.connect(self.refresh)
-                toolbar1.addAction(action)
+
+        action12 = QAction("Undo", self)
+        action12.setShortcut(QKeySequence.Undo)
+        action12.triggered.connect(self._undo_cb)
+        action13 = QAction("Redo", self)
+        action13.setShortcut(QKeySequence.Redo)
+        action13.triggered.connect(self._redo_cb)
+
+        action14 = QAction("Set Selected", self)
+        action14.triggered.connect(self._set_selected_cb)
+        action15 = QAction("Edit Table", self)
+        action15.setCheckable(True)
+        action15.toggled.connect(self._edit_table_cb)
+
+        toolbar1.addAction(action15)
+        toolbar1.addAction(action12)
+        toolbar1.addAction(action13)
+        toolbar1.addAction(action14)
+        self.edit_action = action15
+        toolbar1.addSeparator()
+        self.plugin_actions = self._plugin_actions()
+        toolbar1.addActions(self.plugin_actions)
+
+        action11 = QAction("Merge Duplicates", self)
+        action11.setCheckable(True)
+        action11.toggled.connect(self._merge_duplicates_cb)
 
         toolbar1.addAction(action4)
+        toolbar1.addAction(action6)
+        toolbar1.addAction(action11)
+        toolbar1.addSeparator()
+
+        action7 = QAction("Capture Profile", self)
+        action7.setCheckable(True)
+        action7.toggled.connect(self._capture_profile_cb)
+        action8 = QAction("Save Profile", self)
+        action8.triggered.connect(self._save_profile_cb)
+
+        toolbar1.addAction(action7)
+        toolbar1.addAction(action8)
+        toolbar1.addSeparator()
+
+        search1 = QLineEdit(self)
+        search1.setPlaceholderText('Search COLUMN=value or COLUMN=val*')
+        search1.setClearButtonEnabled(True)
+        search1.setMaximumWidth(300)
+        search1.returnPressed.connect(self._search_cb)
+
+        toolbar1.addWidget(search1)
+        self.search = search1
 
         self.addToolBar(toolbar1)
+        self.toolbar = toolbar1
+        self.update_action = action4
+
+    def _plugin_actions(self) -> List[QAction]:
+        actions = []
+        for plugin_name, button in self.interface.list_buttons():
+            action = QAction(button.name, self)
+            callback = self.interface.profiler.profiled(f'{plugin_name}.{button.name}', button.callback)
+            if button.background:
+                action.triggered.connect(
+                    lambda checked=False, callback=callback, name=button.name: self.run_job(callback, name)
+                )
+            else:
+                action.triggered.connect(
+                    lambda checked=False, callback=callback, name=button.name: self._journaled(name, callback)
+                )
+                action.triggered.connect(self.refresh)
+                action.triggered.connect(self._show_profile)
+            actions.append(action)
+
+        return actions
+
+    def update_plugins(self) -> None:
+        """Discover the installed plugins and replace the plugin buttons when
+        they have changed since the cached manifest was made."""
+        if not self.interface.update_plugins():
+            return
+
+        for action in self.plugin_actions:
+            self.toolbar.removeAction(action)
+            action.deleteLater()
+
+        self.plugin_actions = self._plugin_actions()
+        self.toolbar.insertActions(self.update_action, self.plugin_actions)
 
     def _init_statusbar(self):
         statusbar1 = QStatusBar(self)
 
+        progress1 = QProgressBar(statusbar1)
+        progress1.setMaximumWidth(200)
+        progress1.hide()
+
+        button1 = QPushButton('Cancel', statusbar1)
+        button1.clicked.connect(self.runner.cancel)
+        button1.hide()
+
+        statusbar1.addPermanentWidget(progress1)
+        statusbar1.addPermanentWidget(button1)
+
         self.setStatusBar(statusbar1)
+        self.progress = progress1
+        self.cancel_button = button1
 
     def _init_tabs(self):
         tabs1 = QTabWidget()
         tabs1.setTabPosition(tabs1.North)
+        tabs1.currentChanged.connect(self._tab_changed_cb)
         self.setCentralWidget(tabs1)
 
         self.addTab = tabs1.addTab
         self.clearTabs = tabs1.clear
+        self.tabs = tabs1
 
     def _new_template_cb(self):
         self.clearTabs()
@@ -233,53 +595,326 @@ class MakingRoutes(QMainWindow):
 
         if dialog1.selectedFiles():
             self.filename = dialog1.selectedFiles()[0]
-                
+            self.refresh()
+            self.run_job(self._load_template, 'Loading', self._template_loaded)
+
+    def _load_template(self):
+        from .plugins.core import PROGRESS_INTERVAL
+
+        count, rows = excel_rows(self.filename, 'TEMPLATE_V3')
+
+        def records():
+            for index, row in enumerate(rows):
+                if index % PROGRESS_INTERVAL == 0:
+                    self.interface.report_progress(index, count, 'Loading')
+
+                yield template_record(row)
+
+        self.interface.append_records(records())
+
+    def _open_workspace_cb(self):
+        dialog1 = QFileDialog(self, 'Open Workspace...')
+        dialog1.setNameFilter(f"Workspace (*{WORKSPACE_SUFFIX})")
+        dialog1.exec()
+
+        if not dialog1.selectedFiles():
+            return
+
+        try:
+            workspace = Workspace(dialog1.selectedFiles()[0])
+        except (OSError, WorkspaceError) as error:
+            self.interface.prompt_error(str(error))
+            return
+
+        with workspace:
+            stale = workspace.stale
+            if stale and 'TEMPLATE_V3' not in workspace.names:
+                self.interface.prompt_error('The workspace was made with another version and has no template to process again')
+                return
+
             try:
-                for record in load_excel(self.filename, 'TEMPLATE_V3'):
-                    unvalidated_record = UnvalidatedTemplate(**record)
+                if not stale:
+                    views = {name: workspace.load(name) for name in workspace.names}
+                    issues = workspace.issues()
+                else:
+                    records = list(workspace.template_records())
 
-                    try:
-                        self.interface.append_record(ValidatedTemplate(**unvalidated_record.dict()))
+            except WorkspaceError as error:
+                self.interface.prompt_error(str(error))
+                return
 
-                    except ValidationError:
-                        self.interface.append_record(ValidatedTemplate.construct(**unvalidated_record.dict()))
+        self.interface.mvc.clear(True)
+        self.interface.processed = None
 
-            except KeyError as error:
-                QMessageBox.critical(self, 'Error', str(error))
+        if not stale:
+            for name, records in views.items():
+                if len(records):
+                    self.interface.mvc.set_view(name, records)
 
-            else:
-                self.interface.mvc.protect('TEMPLATE_V3')
-                self.refresh()
+            for name in workspace.protected & self.interface.mvc.views.keys():
+                self.interface.mvc.protect(name)
+
+            self.interface.mvc.report.add(issues)
+
+            self.interface.trigger('ON_LOAD')
+            self.refresh()
+            self.statusBar().showMessage(f'Opened workspace {workspace.path.name}', 5000)
+            return
+
+        self.interface.append_records(records)
+        self._template_loaded(True)
+        self._rebuild_outputs_cb()
+
+    def _save_workspace_cb(self):
+        dialog1 = QFileDialog(self, 'Save Workspace...')
+        dialog1.setAcceptMode(QFileDialog.AcceptSave)
+        dialog1.setNameFilter(f"Workspace (*{WORKSPACE_SUFFIX})")
+        dialog1.setDefaultSuffix(WORKSPACE_SUFFIX[1:])
+        dialog1.exec()
+
+        if dialog1.selectedFiles():
+            filename = dialog1.selectedFiles()[0]
+            self.interface.trigger('ON_SAVE')
+            # the tables stay editable while the job writes the file
+            views = {name: snapshot(table.get()) for name, table in self.interface.mvc.views.items()}
+            protected = set(self.interface.mvc.protected)
+            issues = self.interface.mvc.report.issues()
+
+            self.run_job(lambda: save_workspace(views, protected, filename, issues), 'Saving workspace')
+
+    def _template_loaded(self, ok: bool):
+        if ok and 'TEMPLATE_V3' in self.interface.mvc.views:
+            self.interface.mvc.protect('TEMPLATE_V3')
+            self.interface.trigger('ON_LOAD')
+        else:
+            self.interface.mvc.clear(True)
 
     def _process_template_cb(self):
+        if self.interface.update_outputs():
+            self.statusBar().showMessage('Outputs updated', 5000)
+            self.refresh()
+        else:
+            self._rebuild_outputs_cb()
+
+    def _rebuild_outputs_cb(self):
         self.interface.mvc.clear()
-        self.interface.trigger('ON_PROCESS')
+        self.interface.processed = None
         self.refresh()
 
+        template = self.interface.mvc.views.get('TEMPLATE_V3')
+        if template is not None:
+            template.model.take_dirty()
+
+        def finished(ok: bool):
+            if ok and template is not None:
+                self.interface.processed = template.model
+
+        self.run_job(lambda: self.interface.trigger('ON_PROCESS'), 'Processing', finished)
+
+    def run_job(self, callback, message: str = '', on_finished=None):
+        """Run the callback on a worker thread, showing progress in the
+        status bar until it is done."""
+        def finished(ok: bool):
+            if on_finished is not None:
+                on_finished(ok)
+
+            self.toolbar.setEnabled(True)
+            self.progress.hide()
+            self.cancel_button.hide()
+            self.interface.mvc.update_report()
+            self.refresh()
+
+            summary = self.interface.profiler.summary()
+            dedup = self.interface.mvc.dedup
+            if dedup is not None and dedup.summary():
+                summary = '; '.join(filter(None, [summary, f'duplicates {dedup.summary()}']))
+
+            status = f'{message} done' if ok else f'{message} stopped'
+            self.statusBar().showMessage(f'{status}: {summary}' if summary else status)
+
+        if self.runner.start(callback, finished):
+            self.toolbar.setEnabled(False)
+            self.progress.setRange(0, 0)
+            self.progress.show()
+            self.cancel_button.show()
+            self.statusBar().showMessage(message)
+
+    def _show_profile(self):
+        summary = self.interface.profiler.summary()
+        if summary:
+            self.statusBar().showMessage(summary)
+
+    def _search_cb(self):
+        view = self.tabs.currentWidget()
+        if not isinstance(view, (LazyRecordView, OutputRecordView)):
+            return
+
+        try:
+            count = view.search(self.search.text())
+        except ValueError as error:
+            self.statusBar().showMessage(str(error), 5000)
+            return
+
+        self.statusBar().showMessage(f'{count} rows shown in {self.tabs.tabText(self.tabs.currentIndex())}', 5000)
+
+    def _journaled(self, name: str, callback: Callable) -> Any:
+        """Call a button callback with its edits of every table joined into
+        one undo step."""
+        with ExitStack() as stack:
+            for view in self.interface.mvc.views.values():
+                if isinstance(view, LazyRecordView) and view.table is not None:
+                    stack.enter_context(view.model.journal.group(name))
+
+            return callback()
+
+    def _undo_cb(self):
+        self._step_cb(undo=True)
+
+    def _redo_cb(self):
+        self._step_cb(undo=False)
+
+    def _step_cb(self, undo: bool):
+        table = self._table()
+        if table is None:
+            return
+
+        label = table.model.undo() if undo else table.model.redo()
+        if label is None:
+            self.statusBar().showMessage('Nothing to undo' if undo else 'Nothing to redo', 5000)
+        else:
+            self.statusBar().showMessage(f'Undid {label}' if undo else f'Redid {label}', 5000)
+
+    def _table(self) -> Optional[OutputRecordView]:
+        """Table of the current tab, None if it has not been created."""
+        view = self.tabs.currentWidget()
+        if isinstance(view, LazyRecordView):
+            return view.table
+
+        return view if isinstance(view, OutputRecordView) else None
+
+    def _tab_changed_cb(self, index: int):
+        table = self._table()
+        self.edit_action.setChecked(table is not None and table.model.editable)
+
+    def _edit_table_cb(self, checked: bool):
+        view = self.tabs.currentWidget()
+        table = view.widget() if isinstance(view, LazyRecordView) else self._table()
+        if table is not None and table.model.editable != checked:
+            table.toggle_editable()
+
+    def _set_selected_cb(self):
+        table = self._table()
+        if table is None or not table.model.editable:
+            return
+
+        text, ok = QInputDialog.getText(self, 'Set Selected', 'Value of the selected cells (empty to clear)')
+        if ok:
+            count = table.set_selected(text)
+            self.statusBar().showMessage(f'{count} records changed', 5000)
+
+    def _merge_duplicates_cb(self, checked: bool):
+        self.interface.mvc.dedup = Deduplicator() if checked else None
+        self.interface.processed = None
+
+    def _capture_profile_cb(self, checked: bool):
+        self.interface.profiler.capture = checked
+
+    def _save_profile_cb(self):
+        dialog1 = QFileDialog(self, 'Save Profile...')
+        dialog1.setAcceptMode(QFileDialog.AcceptSave)
+        dialog1.setNameFilter("Profile (*.json)")
+        dialog1.exec()
+
+        if dialog1.selectedFiles():
+            self.interface.profiler.dump(dialog1.selectedFiles()[0])
+
+    def _job_progress(self, current: int, total: int, message: str):
+        self.progress.setRange(0, total)
+        self.progress.setValue(current)
+        self.statusBar().showMessage(message)
+
+    def _job_records(self):
+        if self.tabs.count() != len(self.interface.mvc.views):
+            self.refresh()
+
     def refresh(self):
-        self.clearTabs()
-        for name, view in self.interface.mvc.views.items():
-            self.addTab(view, name)
+        """Remove the tabs of views that are gone or replaced, and add tabs
+        for new views. Tabs of unchanged views are left as they are."""
+        views = self.interface.mvc.views
+        shown = set()
+        for index in reversed(range(self.tabs.count())):
+            widget = self.tabs.widget(index)
+            if views.get(self.tabs.tabText(index)) is widget:
+                shown.add(self.tabs.tabText(index))
+            else:
+                self.tabs.removeTab(index)
+                widget.setParent(None)
+
+        for name, view in views.items():
+            if name not in shown:
+                self.addTab(view, name)
+                if name == REPORT_API:
+                    view.recordActivated.connect(self._show_issue_cb)
+
+    def _show_issue_cb(self, row: int):
+        """Select the next record with the errors of a report row. Pressing
+        the same report row again steps through its records."""
+        summary = self.interface.mvc.views[REPORT_API].get()[row]
+        group = (summary.kind, summary.api, summary.field, summary.code)
+        rows = self.interface.mvc.report.rows(group) or [summary.row]
+
+        position = self._issue_positions.get(group, -1) + 1
+        if position >= len(rows):
+            position = 0
+        self._issue_positions[group] = position
+
+        view = self.interface.mvc.views.get(summary.api)
+        if view is None:
+            self.statusBar().showMessage(f'No view for {summary.api}', 5000)
+            return
+
+        self.tabs.setCurrentWidget(view)
+        if not view.show_record(rows[position]):
+            self.statusBar().showMessage(f'Row {rows[position]} of {summary.api} is not shown', 5000)
+            return
+
+        messages = '; '.join(
+            f'{issue.field} {issue.message}' if issue.field else issue.message
+            for issue in self.interface.mvc.report.for_record(summary.api, rows[position])
+        )
+        self.statusBar().showMessage(f'{summary.api} row {rows[position]} ({position + 1} of {len(rows)}): {messages}')
 
     def _save_tables_cb(self):
         dialog1 = QFileDialog(self, 'Open Template File...')
         dialog1.setAcceptMode(QFileDialog.AcceptSave)
-        dialog1.setNameFilter("Template (*.xlsx)")
+        dialog1.setNameFilters(list(SAVE_FILTERS))
         dialog1.exec()
 
         if dialog1.selectedFiles():
             filename = dialog1.selectedFiles()[0]
+            if export_format(filename) is None:
+                filename += SAVE_FILTERS[dialog1.selectedNameFilter()]
+
             self.setStatusTip(f'Saved template {self.filename}')
 
-            records = [record for table in self.interface.mvc.views.values() for record in table.get()]
+            self.interface.trigger('ON_SAVE')
+            # the tables stay editable while the job writes the file
+            views = {name: snapshot(table.get()) for name, table in self.interface.mvc.views.items()}
 
-            if not records == []:
-                save_excel(records, filename)
+            if any(len(records) for records in views.values()) or export_format(filename) != '.xlsx':
+                self.run_job(lambda: save_views(views, filename, self.interface.report_progress), 'Saving')
             else:
+                from many_more_routes.io import save_template
                 save_template(ValidatedTemplate, filename)
 
 
-def main():
+def print_versions():
+    try:
+        from importlib import metadata as importlib_metadata
+    except ImportError:
+        # Backwards compatibility - importlib.metadata was added in Python 3.8
+        import importlib_metadata
+
     app_module = sys.modules['__main__'].__package__
     metadata = importlib_metadata.metadata(app_module)
 
@@ -288,6 +923,29 @@ def main():
     print(f"many_more_routes version {importlib_metadata.version('many_more_routes')}")
     print(f"route_sequence version {importlib_metadata.version('route_sequence')}")
 
+
+def main(started: Optional[float] = None):
+    """Start the user interface. Package versions are looked up and the
+    plugins discovered once the window is shown. With --profile-startup the time from started, or from
+    the call, to each step of the start up is printed."""
+    timer = StartupTimer(started if started is not None else time.perf_counter())
+    profile = '--profile-startup' in sys.argv
+    if profile:
+        sys.argv.remove('--profile-startup')
+
+    timer.mark('imports')
     app = QApplication(sys.argv)
+    timer.mark('application')
     main_window = MakingRoutes()
+    timer.mark('window')
+
+    def shown():
+        timer.mark('shown')
+        if profile:
+            print(timer.report(), file=sys.stderr)
+
+        print_versions()
+        main_window.update_plugins()
+
+    QTimer.singleShot(0, shown)
     sys.exit(app.exec())
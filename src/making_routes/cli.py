@@ -0,0 +1,309 @@
+"""
+Process templates from the command line without starting the user interface.
+
+    python -m making_routes process template.xlsx -o output.xlsx
+
+The outputs can also be written as one csv file per api with -o output.csv,
+or as compact columnar json with -o output.json.gz. With --dedup duplicate
+output records are merged before saving.
+"""
+import argparse
+import sys
+import time
+
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Dict, Iterator, List, Literal, Optional, Sequence, Tuple, Union
+
+from many_more_routes.ducks import OutputRecord
+from many_more_routes.models import UnvalidatedTemplate
+from many_more_routes.models import ValidatedTemplate
+
+from many_more_routes.io import save_template
+
+from .access import RecordRows, RecordSequence
+from .dedup import Deduplicator
+from .engine import DEFAULT_WORKERS, TriggerEngine
+from .excel import excel_rows
+from .export import FORMATS, export_format, save_views
+from .parallel import DEFAULT_CHUNK_SIZE, trigger_parallel
+from .plugin import Plugin, PluginInterfaceBase
+from .profiling import Profiler
+from .records import template_record
+from . import validation
+from .store import RecordStore, field_values
+from .workspace import SUFFIX as WORKSPACE_SUFFIX
+from .workspace import save_workspace
+
+from .plugins.core import MakeRoutePlugin
+from .plugins.core import MakeCustomerExtensionExtendedPlugin
+from .plugins.core import MakeCustomerExtensionPlugin
+from .plugins.core import MakeDeparturePlugin
+from .plugins.core import MakeSelectionPlugin
+from .plugins.core import ValidatePlugin
+
+
+class HeadlessInterface(PluginInterfaceBase):
+    """Plugin interface backed by a RecordStore. Prompts are never answered."""
+    def __init__(self, compact: bool = False, dedup: Optional[Deduplicator] = None, threads: int = DEFAULT_WORKERS):
+        self.mvc = RecordStore(compact=compact, dedup=dedup)
+        self.profiler = Profiler()
+        self.engine = TriggerEngine(threads)
+        self.__plugins: List[Plugin] = []
+
+    def _view_name(self, model: Union[int, str]) -> str:
+        if isinstance(model, int):
+            model = list(self.mvc.views.keys())[model]
+
+        if isinstance(model, str):
+            if model not in self.mvc.views.keys():
+                raise ValueError(f"Cannot find {model} in the MVC")
+
+        return model
+
+    def list_records(self, model: Union[int, str] = 0) -> List[UnvalidatedTemplate|ValidatedTemplate]:
+        return self.mvc.views[self._view_name(model)].copy()
+
+    def records(self, model: Union[int, str] = 0) -> RecordSequence:
+        model = self._view_name(model)
+        return RecordSequence(model, partial(self.mvc.get_view, model))
+
+    def record_rows(self, models: Union[str, Sequence[str], None] = None) -> RecordRows:
+        if models is None:
+            models = list(self.mvc.views.keys())
+        elif isinstance(models, str):
+            models = [models]
+
+        return RecordRows(self.records(model) for model in models)
+
+    def update_record(self, index: int, record: UnvalidatedTemplate|ValidatedTemplate) -> None:
+        if self.engine.in_task():
+            return self.engine.defer(self.update_record, index, record)
+
+        self.mvc.views[record._api][index] = record
+
+    def list_values(self, name: str, model: Union[int, str, None] = 0) -> List[Any]:
+        if model is None:
+            return [value for key in self.mvc.views.keys() for value in self.list_values(name, key)]
+
+        if isinstance(model, int):
+            model = list(self.mvc.views.keys())[model]
+
+        if model not in self.mvc.views.keys():
+            raise ValueError(f"Cannot find {model} in the MVC")
+
+        return field_values(self.mvc.views[model], name)
+
+    def update_values(self, name: str, values: Dict[int, Any], model: Union[int, str] = 0) -> None:
+        if isinstance(model, int):
+            model = list(self.mvc.views.keys())[model]
+
+        self.profiler.add(len(values))
+        if self.engine.in_task():
+            return self.engine.defer(self.mvc.update_values, model, name, values)
+
+        self.mvc.update_values(model, name, values)
+
+    def append_record(self, record: OutputRecord) -> None:
+        self.append_records([record])
+
+    def append_records(self, records) -> None:
+        records = self.profiler.count(records)
+        if self.engine.in_task():
+            self.engine.defer(self.mvc.append_records, list(records))
+        else:
+            self.mvc.append_records(records)
+
+    def clear_issues(self, kind: Optional[str] = None) -> None:
+        if self.engine.in_task():
+            return self.engine.defer(self.clear_issues, kind)
+
+        self.mvc.report.clear(kind)
+
+    def prompt_error(self, error_message: str):
+        print(f'Error: {error_message}', file=sys.stderr)
+
+    def replace_records(self, replacements) -> None:
+        if self.engine.in_task():
+            return self.engine.defer(self.replace_records, replacements)
+
+        self.mvc.replace_records(replacements)
+
+    def report_progress(self, current: int, total: int, message: str = '') -> None:
+        pass
+
+    def prompt(self, header: str, message: str, text: Optional[str] = '') -> Tuple[Any, Any]:
+        return text, False
+
+    def register(self, plugin: Plugin) -> None:
+        self.__plugins.append(plugin)
+
+    def list_plugins(self) -> List[Plugin]:
+        return list(self.__plugins)
+
+    def list_all_records(self):
+        return list(self.record_rows())
+
+    def trigger(self, event: Literal[
+        'ON_LOAD',
+        'ON_SAVE',
+        'ON_VALIDATE',
+        'ON_PROCESS'
+    ]):
+        self.profiler.new_run()
+        triggers = [
+            (type(plugin).__name__, trigger)
+            for plugin in filter(lambda x: x.enabled, self.list_plugins())
+            for trigger in plugin.triggers() if trigger.event == event
+        ]
+        # a cProfile only follows its own thread
+        self.engine.run(triggers, self.profiler.measure, workers=1 if self.profiler.capture else None)
+
+
+@contextmanager
+def timed(timings: Dict[str, float], name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def process(
+    filename: str,
+    output: str,
+    validate: bool = True,
+    workers: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    profiler: Optional[Profiler] = None,
+    compact: bool = False,
+    workspace: Optional[str] = None,
+    dedup: Optional[Deduplicator] = None,
+    threads: int = DEFAULT_WORKERS
+) -> Tuple[Dict[str, float], Dict[str, int], Dict[str, int]]:
+    """Load a template, run all ON_PROCESS plugins and save the result.
+    With more than one worker the make plugins run in a process pool.
+    With compact set the records are kept as tuples of values. All views
+    are also written to a workspace file when given. With a deduplicator
+    duplicate outputs are merged as they are made. Independent triggers of
+    an event run on up to threads threads.
+    Returns the timings per step, the number of records per api and the
+    number of issues per kind."""
+    timings: Dict[str, float] = {}
+
+    interface = HeadlessInterface(compact=compact, dedup=dedup, threads=threads)
+    if profiler is not None:
+        interface.profiler = profiler
+
+    MakeRoutePlugin(interface)
+    MakeDeparturePlugin(interface)
+    MakeSelectionPlugin(interface)
+    MakeCustomerExtensionPlugin(interface)
+    MakeCustomerExtensionExtendedPlugin(interface)
+    ValidatePlugin(interface)
+
+    with timed(timings, 'load'):
+        count, rows = excel_rows(filename, 'TEMPLATE_V3')
+        interface.append_records(map(template_record, rows))
+        if 'TEMPLATE_V3' in interface.mvc.views:
+            interface.mvc.protect('TEMPLATE_V3')
+            interface.trigger('ON_LOAD')
+
+    with timed(timings, 'process'):
+        if 'TEMPLATE_V3' not in interface.mvc.views:
+            pass
+
+        elif workers > 1:
+            interface.profiler.new_run()
+            trigger_parallel(interface, workers=workers, chunk_size=chunk_size, measure=interface.profiler.measure)
+
+        else:
+            interface.trigger('ON_PROCESS')
+
+    if validate:
+        with timed(timings, 'validate'):
+            interface.trigger('ON_VALIDATE')
+
+    interface.mvc.update_report()
+
+    with timed(timings, 'save'):
+        interface.trigger('ON_SAVE')
+        if any(len(view) for view in interface.mvc.views.values()) or export_format(output) != '.xlsx':
+            save_views(interface.mvc.views, output)
+        else:
+            save_template(ValidatedTemplate, output)
+
+    if workspace is not None:
+        with timed(timings, 'workspace'):
+            save_workspace(interface.mvc.views, interface.mvc.protected, workspace, interface.mvc.report.issues())
+
+    return timings, interface.mvc.counts(), interface.mvc.report.counts()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='making_routes process',
+        description='Process a TEMPLATE_V3 workbook without the user interface.'
+    )
+    parser.add_argument('filename', help='template workbook to process')
+    parser.add_argument('-o', '--output', required=True, help=f'file to write the outputs to, ending with {", ".join(FORMATS)}')
+    parser.add_argument('--no-validate', action='store_true', help='skip validation of the outputs')
+    parser.add_argument('-j', '--workers', type=int, default=0, help='number of worker processes, 0 or 1 runs serially')
+    parser.add_argument('--threads', type=int, default=DEFAULT_WORKERS, help='threads for plugin triggers that do not depend on each other, the default 1 runs them one after the other')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='template rows per worker task')
+    parser.add_argument('--workspace', help=f'also write a workspace file, ending with {WORKSPACE_SUFFIX}, to open in the user interface')
+    parser.add_argument('--compact', action='store_true', help='keep records as tuples of values, uses less memory')
+    parser.add_argument('--dedup', action='store_true', help='merge duplicate output records, conflicting duplicates are reported as errors')
+    parser.add_argument('--profile', help='write per plugin timings to this JSON file')
+    parser.add_argument('--cprofile', action='store_true', help='also capture a cProfile next to the --profile file')
+    args = parser.parse_args(argv)
+    if args.cprofile and not args.profile:
+        parser.error('--cprofile needs --profile')
+
+    if export_format(args.output) is None:
+        print(f'Error: cannot export to "{args.output}", use one of {", ".join(FORMATS)}', file=sys.stderr)
+        return 1
+
+    profiler = Profiler(capture=args.cprofile)
+    dedup = Deduplicator() if args.dedup else None
+
+    try:
+        timings, counts, issues = process(
+            args.filename,
+            args.output,
+            validate=not args.no_validate,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            profiler=profiler,
+            compact=args.compact,
+            workspace=args.workspace,
+            dedup=dedup,
+            threads=args.threads
+        )
+
+    except (KeyError, ValueError) as error:
+        print(f'Error: {error}', file=sys.stderr)
+        return 1
+
+    for name, seconds in timings.items():
+        print(f'{name:<10} {seconds:>9.3f} s')
+
+    for name, count in counts.items():
+        print(f'{name:<30} {count:>9} rows')
+
+    for kind, count in issues.items():
+        print(f'{kind:<30} {count:>9} issues')
+
+    for measurement in profiler.stats.values():
+        print(f'{measurement.name:<40} {measurement.seconds:>9.3f} s {measurement.records:>9} records {measurement.errors:>7} errors')
+
+    if dedup is not None:
+        print(f'duplicates {dedup.summary() or "none"}')
+
+    if args.profile:
+        profiler.dump(args.profile)
+
+    info = validation.cache.info()
+    print(f"validation cache {info['hits']} hits, {info['misses']} misses")
+
+    return 0
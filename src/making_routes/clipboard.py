@@ -0,0 +1,36 @@
+"""
+Tab separated text as copied from and pasted into spreadsheets. Cells
+holding tabs or line breaks are quoted, the way Excel copies them.
+"""
+import csv
+import io
+
+from typing import Any, List, Sequence
+
+
+def parse_table(text: str) -> List[List[str]]:
+    """Rows of cells of copied text. A trailing line break does not add an
+    empty row, other empty lines are rows of one empty cell."""
+    if not text:
+        return []
+
+    if text.endswith('\r\n'):
+        text = text[:-2]
+    elif text.endswith('\n'):
+        text = text[:-1]
+
+    rows = [row or [''] for row in csv.reader(io.StringIO(text), delimiter='\t')]
+    if not text or text.endswith('\n'):
+        rows.append([''])
+
+    return rows
+
+
+def format_table(rows: Sequence[Sequence[Any]]) -> str:
+    """Text of rows of cells, with empty cells for None."""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter='\t', lineterminator='\n')
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+
+    return output.getvalue()
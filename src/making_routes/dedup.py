@@ -0,0 +1,104 @@
+"""
+Removal of duplicate output records. Different template rows often make the
+same route, selection or customer extension, which M3 would reject when
+uploaded a second time.
+
+Records are identified by the key fields of their api. The first record of
+each key is kept and exact duplicates are dropped. Duplicates with the same
+key but other values differing are dropped as well and reported as a
+processing issue of the kept record, since only one of them can be uploaded.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from many_more_routes.ducks import OutputRecord
+
+from .report import Issue
+
+IDENTITY_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'API_DRS005MI_AddRoute': ('ROUT',),
+    'MPD_DRS006_Create_CL': ('WWROUT', 'WWRODN'),
+    'API_DRS011MI_Add': ('EDES', 'PREX', 'OBV1', 'OBV2', 'OBV3', 'OBV4'),
+    'API_CUSEXTMI_AddFieldValue': ('FILE', 'PK01', 'PK02'),
+    'API_CUSEXTMI_ChgFieldValueEx': ('FILE', 'PK01'),
+}
+
+IGNORED_FIELDS = {'Message'}
+
+
+class Deduplicator:
+    """Hash index of the keys seen per api. Records of apis without key
+    fields are passed through unchanged."""
+    def __init__(self, identity: Dict[str, Tuple[str, ...]] = IDENTITY_FIELDS):
+        self.identity = identity
+        self.seen: Dict[str, Dict[Tuple, Tuple[int, Tuple]]] = {}
+        self.merged: Dict[str, int] = {}
+        self.conflicts: Dict[str, int] = {}
+        self._fields: Dict[type, Tuple[str, ...]] = {}
+
+    def _values(self, record: OutputRecord) -> Tuple:
+        try:
+            fields = self._fields[type(record)]
+        except KeyError:
+            fields = self._fields[type(record)] = tuple(
+                name for name in type(record).__fields__ if name not in IGNORED_FIELDS
+            )
+
+        return tuple(getattr(record, name, None) for name in fields)
+
+    def _conflict(self, api: str, key: Tuple, record: OutputRecord, row: int, first: Tuple) -> Issue:
+        fields = self._fields[type(record)]
+        keys = ' '.join(f'{name}={value}' for name, value in zip(self.identity[api], key))
+        differences = [
+            (name, old, new)
+            for name, old, new in zip(fields, first, self._values(record)) if old != new
+        ]
+        message = ', '.join(f'{name} {old!r} != {new!r}' for name, old, new in differences)
+
+        return Issue(
+            'PROCESSING_ERROR', api, row, differences[0][0], differences[0][2],
+            'duplicate.conflict', f'Conflicting duplicate {keys}; {message}'
+        )
+
+    def filter(self, records: Iterable[OutputRecord]) -> Iterator[OutputRecord]:
+        """The records without the duplicates of records seen before, and an
+        issue for each conflicting duplicate, on the row of the kept record."""
+        for record in records:
+            api = getattr(record, '_api', None)
+            names = self.identity.get(api)
+            if names is None:
+                yield record
+                continue
+
+            key = tuple(getattr(record, name, None) for name in names)
+            values = self._values(record)
+            seen = self.seen.setdefault(api, {})
+
+            first = seen.get(key)
+            if first is None:
+                seen[key] = (len(seen), values)
+                yield record
+
+            elif first[1] == values:
+                self.merged[api] = self.merged.get(api, 0) + 1
+
+            else:
+                self.conflicts[api] = self.conflicts.get(api, 0) + 1
+                yield self._conflict(api, key, record, *first)
+
+    def forget(self, apis: Iterable[str]) -> None:
+        """Drop the keys of apis whose records were cleared."""
+        for api in apis:
+            self.seen.pop(api, None)
+            self.merged.pop(api, None)
+            self.conflicts.pop(api, None)
+
+    def clear(self) -> None:
+        self.forget(list(self.seen.keys()))
+
+    def summary(self) -> str:
+        """Merged and conflicting duplicates per api, or an empty string."""
+        apis: List[Any] = list(dict.fromkeys([*self.merged, *self.conflicts]))
+        return ', '.join(
+            f'{api} {self.merged.get(api, 0)} merged, {self.conflicts.get(api, 0)} conflicting'
+            for api in apis
+        )
@@ -0,0 +1,160 @@
+"""
+Runs the triggers of an event, concurrently where they allow it.
+
+A trigger declaring the views it reads and writes only has to wait for the
+earlier triggers writing a view it reads, and runs on a thread pool.
+Changes it makes through the interface are collected while it runs and
+applied afterwards in the order the triggers were registered, so the
+results are the same as running them one after the other. Triggers that
+declare nothing run on the calling thread with every earlier trigger
+finished before and every later trigger started after them.
+
+The plugins mostly run Python code holding the GIL, and changes are only
+shown once applied, so by default the triggers run one after the other
+and their rows appear as they are made.
+"""
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Sequence, Tuple
+
+from .plugin import Cancelled, Trigger
+
+WILDCARD = '*'
+DEFAULT_WORKERS = 1
+
+Measure = Callable[[str], ContextManager]
+
+
+def declared(trigger: Trigger) -> bool:
+    return getattr(trigger, 'reads', None) is not None and getattr(trigger, 'writes', None) is not None
+
+
+def overlaps(reads: Sequence[str], writes: Sequence[str]) -> bool:
+    if not reads or not writes:
+        return False
+
+    return WILDCARD in reads or WILDCARD in writes or not set(reads).isdisjoint(writes)
+
+
+def depends(later: Trigger, earlier: Trigger) -> bool:
+    """True when the later trigger has to wait for the earlier one. Writes
+    are applied in order, so only reading what an earlier trigger writes
+    makes a trigger wait."""
+    if not declared(later) or not declared(earlier):
+        return True
+
+    return overlaps(later.reads, earlier.writes)
+
+
+@dataclass
+class Task:
+    """A trigger to run, with the last earlier task it waits for."""
+    index: int
+    name: str
+    trigger: Trigger
+    after: int = -1
+    operations: List[Tuple[Callable, Tuple]] = field(default_factory=list)
+
+    @property
+    def concurrent(self) -> bool:
+        return declared(self.trigger)
+
+
+def plan(triggers: Sequence[Tuple[str, Trigger]]) -> List[Task]:
+    tasks = [Task(index, name, trigger) for index, (name, trigger) in enumerate(triggers)]
+    for task in tasks:
+        for earlier in reversed(tasks[:task.index]):
+            if depends(task.trigger, earlier.trigger):
+                task.after = earlier.index
+                break
+
+    return tasks
+
+
+class TriggerEngine:
+    """Runs triggers on up to workers threads. Interfaces call defer for
+    every change made from a running task."""
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+        self._local = threading.local()
+        self._stop = threading.Event()
+
+    def in_task(self) -> bool:
+        """True when called from a trigger running on the pool."""
+        return getattr(self._local, 'task', None) is not None
+
+    def defer(self, callback: Callable, *args: Any) -> None:
+        """Collect a change of the running task, applied when its turn comes."""
+        if self._stop.is_set():
+            raise Cancelled()
+
+        self._local.task.operations.append((callback, args))
+
+    def _run(self, task: Task, measure: Measure) -> None:
+        self._local.task = task
+        try:
+            with measure(task.name):
+                task.trigger.callback()
+        finally:
+            self._local.task = None
+
+    def run(self, triggers: Sequence[Tuple[str, Trigger]], measure: Optional[Measure] = None, workers: Optional[int] = None) -> None:
+        """Run the named triggers on up to workers threads, by default those
+        of the engine. The first error is raised once the running triggers
+        have stopped, with the changes of the triggers before it applied."""
+        measure = measure or (lambda name: nullcontext())
+        workers = self.workers if workers is None else workers
+        tasks = plan(triggers)
+
+        if workers <= 1 or sum(task.concurrent for task in tasks) < 2:
+            for task in tasks:
+                with measure(task.name):
+                    task.trigger.callback()
+            return
+
+        self._stop.clear()
+        started = set()
+        running: Dict[Future, Task] = {}
+        errors: Dict[int, Optional[BaseException]] = {}
+        applied = 0
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='trigger') as pool:
+            try:
+                while applied < len(tasks):
+                    for task in tasks:
+                        if task.index in started or task.after >= applied:
+                            continue
+
+                        if task.concurrent:
+                            started.add(task.index)
+                            running[pool.submit(self._run, task, measure)] = task
+
+                        elif task.index == applied:
+                            started.add(task.index)
+                            try:
+                                with measure(task.name):
+                                    task.trigger.callback()
+                                errors[task.index] = None
+                            except BaseException as error:
+                                errors[task.index] = error
+
+                    if applied not in errors:
+                        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            errors[running.pop(future).index] = future.exception()
+
+                    while applied in errors:
+                        task = tasks[applied]
+                        for callback, args in task.operations:
+                            callback(*args)
+                        task.operations = []
+                        applied += 1
+
+                        if errors[task.index] is not None:
+                            raise errors[task.index]
+
+            finally:
+                self._stop.set()
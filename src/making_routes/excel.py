@@ -0,0 +1,44 @@
+"""
+Streaming excel reader. Rows are read one at a time from a read only
+workbook instead of loading the whole sheet into memory.
+"""
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+FIRST_DATA_ROW = 4
+
+
+def excel_rows(file_path: Union[str, Path], sheet_name: Optional[str] = None) -> Tuple[int, Iterator[Dict]]:
+    """Open a sheet where the first row is the column headers. Returns the
+    number of data rows, as reported by the workbook, and an iterator over
+    the data rows as dictionaries. Behaves like many_more_routes.io.load_excel."""
+    if isinstance(file_path, str):
+        file_path = Path(file_path)
+
+    if not file_path.exists():
+        raise ValueError(f'File "{file_path}" does not exist')
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(str(file_path.absolute()), read_only=True)
+
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+    except KeyError:
+        workbook.close()
+        raise
+
+    count = max((sheet.max_row or 0) - FIRST_DATA_ROW + 1, 0)
+
+    def rows() -> Iterator[Dict]:
+        try:
+            iterator = sheet.iter_rows(values_only=True)
+            headers = next(iterator, ())
+
+            for number, row in enumerate(iterator, start=2):
+                if number >= FIRST_DATA_ROW:
+                    yield {header: value for header, value in zip(headers, row)}
+        finally:
+            workbook.close()
+
+    return count, rows()
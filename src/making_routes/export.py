@@ -0,0 +1,166 @@
+"""
+Streaming export of record views. Every view is written sheet by sheet, or
+file by file, straight from its storage without collecting all records in
+one list first.
+
+    .xlsx       one sheet per api, same layout as many_more_routes save_excel
+    .csv        one file per api, named <stem>_<api>.csv
+    .json.gz    all apis in one gzip compressed file, stored column by column
+"""
+import csv
+import gzip
+import json
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from many_more_routes.ducks import OutputRecord
+
+from .store import field_values, record_values
+
+FORMATS = ('.xlsx', '.csv', '.json.gz')
+PROGRESS_INTERVAL = 5000
+
+Progress = Callable[[int, int, str], None]
+Views = Mapping[str, Sequence[OutputRecord]]
+
+
+def export_format(path: Union[str, Path]) -> Optional[str]:
+    """The export format of a path, from its suffix."""
+    name = str(path).lower()
+    for suffix in FORMATS:
+        if name.endswith(suffix):
+            return suffix
+
+    return None
+
+
+def schema_columns(records: Sequence[OutputRecord]) -> Tuple[List[str], List[str]]:
+    """Field names and descriptive names of the records of a view."""
+    properties = records[0].schema()['properties']
+    names = []
+    for key, value in properties.items():
+        try:
+            names.append(value['name'])
+        except (KeyError, TypeError):
+            names.append(key)
+
+    return list(properties.keys()), names
+
+
+def _rows(views: Views, progress: Optional[Progress]) -> Iterator[Tuple[str, Sequence[OutputRecord], Iterator[Tuple]]]:
+    """Yields the api, records and value rows of every non empty view,
+    reporting progress over all rows."""
+    total = sum(len(records) for records in views.values())
+    done = 0
+
+    def counted(api: str, rows: Iterator[Tuple]) -> Iterator[Tuple]:
+        nonlocal done
+        for row in rows:
+            if progress is not None and done % PROGRESS_INTERVAL == 0:
+                progress(done, total, f'Saving {api}')
+            done += 1
+            yield row
+
+    for api, records in views.items():
+        if len(records):
+            yield api, records, counted(api, record_values(records))
+
+
+def write_excel(views: Views, path: Union[str, Path], progress: Optional[Progress] = None) -> None:
+    """Write every view to its own sheet of a write only workbook."""
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+
+    from many_more_routes.io import ALIGNMENT_ROTATE
+
+    workbook = openpyxl.Workbook(write_only=True)
+
+    for api, records, rows in _rows(views, progress):
+        sheet = workbook.create_sheet(title=api)
+        keys, names = schema_columns(records)
+
+        headers = []
+        for name in names:
+            cell = WriteOnlyCell(sheet, value=name)
+            cell.alignment = ALIGNMENT_ROTATE
+            headers.append(cell)
+
+        flags = ['yes'] * len(keys)
+        if 'Message' in keys:
+            flags[0] = 'no'
+
+        sheet.append(keys)
+        sheet.append(headers)
+        sheet.append(flags)
+
+        for row in rows:
+            sheet.append(row)
+
+    workbook.save(str(path))
+
+
+def csv_path(path: Union[str, Path], api: str) -> Path:
+    path = Path(path)
+    return path.with_name(f'{path.name[:-len(".csv")]}_{api}.csv')
+
+
+def write_csv(views: Views, path: Union[str, Path], progress: Optional[Progress] = None) -> List[Path]:
+    """Write every view to its own csv file next to path, with the field
+    names as the first row. Returns the written files."""
+    written = []
+    for api, records, rows in _rows(views, progress):
+        filename = csv_path(path, api)
+        with open(filename, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(schema_columns(records)[0])
+            writer.writerows(rows)
+
+        written.append(filename)
+
+    return written
+
+
+def write_columnar(views: Views, path: Union[str, Path], progress: Optional[Progress] = None) -> None:
+    """Write all views to one gzip compressed json file, as a list of
+    values per column:
+
+        {"API": {"columns": ["ROUT", ...], "values": [["AA0001", ...], ...]}}
+    """
+    data: Dict[str, Dict[str, Any]] = {}
+    total = sum(len(records) for records in views.values())
+    done = 0
+
+    for api, records in views.items():
+        if not len(records):
+            continue
+
+        keys = schema_columns(records)[0]
+        values = []
+        for key in keys:
+            if progress is not None:
+                progress(done, total, f'Saving {api}')
+            values.append(field_values(records, key))
+
+        data[api] = {'columns': keys, 'values': values}
+        done += len(records)
+
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        json.dump(data, file, default=str, separators=(',', ':'))
+
+
+def save_views(views: Views, path: Union[str, Path], progress: Optional[Progress] = None) -> None:
+    """Export the views in the format given by the suffix of path. Empty
+    views are skipped."""
+    format = export_format(path)
+    if format == '.xlsx':
+        write_excel(views, path, progress)
+
+    elif format == '.csv':
+        write_csv(views, path, progress)
+
+    elif format == '.json.gz':
+        write_columnar(views, path, progress)
+
+    else:
+        raise ValueError(f'Cannot export to "{path}", use one of {", ".join(FORMATS)}')
@@ -0,0 +1,159 @@
+"""
+Run plugin callbacks on a worker thread while keeping the window responsive.
+"""
+import threading
+import time
+
+from typing import Callable, Iterable, List, Optional
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+from many_more_routes.ducks import OutputRecord
+
+from .plugin import Cancelled
+
+BATCH_SIZE = 2000
+FLUSH_INTERVAL = 0.25
+
+
+class JobSignals(QObject):
+    records = Signal(object)
+    progress = Signal(int, int, str)
+    error = Signal(str)
+    finished = Signal(bool)
+
+
+class Job(QRunnable):
+    """Runs a callback on a worker thread. Records appended by the callback
+    are buffered and sent to the GUI thread in batches, at least every
+    FLUSH_INTERVAL seconds so the first rows show up quickly."""
+    def __init__(self, callback: Callable, batch_size: int = BATCH_SIZE):
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.callback = callback
+        self.batch_size = batch_size
+        self.signals = JobSignals()
+        self.thread_id: Optional[int] = None
+        self._buffer: List[OutputRecord] = []
+        self._flushed = time.monotonic()
+        self._cancelled = threading.Event()
+
+    def run(self) -> None:
+        self.thread_id = threading.get_ident()
+        ok = False
+
+        try:
+            self.callback()
+            ok = True
+
+        except Cancelled:
+            pass
+
+        except Exception as exception:
+            self.signals.error.emit(str(exception))
+
+        finally:
+            self.flush()
+            self.signals.finished.emit(ok)
+
+    def is_current(self) -> bool:
+        """True when called from the thread running the job."""
+        return self.thread_id == threading.get_ident()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def append_records(self, records: Iterable[OutputRecord]) -> None:
+        for record in records:
+            self._buffer.append(record)
+
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._flushed > FLUSH_INTERVAL:
+                self.flush()
+                if self.cancelled:
+                    raise Cancelled()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.signals.records.emit(self._buffer)
+            self._buffer = []
+
+        self._flushed = time.monotonic()
+
+    def report_progress(self, current: int, total: int, message: str = '') -> None:
+        if self.cancelled:
+            raise Cancelled()
+
+        self.signals.progress.emit(current, total, message)
+
+
+class JobRunner(QObject):
+    """Runs one job at a time and hands the produced records to the
+    interface from the GUI thread."""
+    progress = Signal(int, int, str)
+    records = Signal()
+    error = Signal(str)
+    finished = Signal(bool)
+
+    def __init__(self, interface, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.interface = interface
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.job: Optional[Job] = None
+        self._on_finished: Optional[Callable[[bool], None]] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.job is not None
+
+    def start(self, callback: Callable, on_finished: Optional[Callable[[bool], None]] = None) -> bool:
+        if self.busy:
+            return False
+
+        job = Job(callback)
+        job.signals.records.connect(self._records)
+        job.signals.progress.connect(self._progress)
+        job.signals.error.connect(self._error)
+        job.signals.finished.connect(self._finished)
+
+        self.job = job
+        self._on_finished = on_finished
+        self.interface.job = job
+        self.pool.start(job)
+
+        return True
+
+    def cancel(self) -> None:
+        if self.job is not None:
+            self.job.cancel()
+
+    @Slot(object)
+    def _records(self, records: List[OutputRecord]) -> None:
+        self.interface.mvc.append_records(records)
+        self.records.emit()
+
+    @Slot(int, int, str)
+    def _progress(self, current: int, total: int, message: str) -> None:
+        self.progress.emit(current, total, message)
+
+    @Slot(str)
+    def _error(self, message: str) -> None:
+        self.error.emit(message)
+
+    @Slot(bool)
+    def _finished(self, ok: bool) -> None:
+        on_finished = self._on_finished
+
+        self.job = None
+        self._on_finished = None
+        self.interface.job = None
+
+        if on_finished is not None:
+            on_finished(ok)
+
+        self.finished.emit(ok)
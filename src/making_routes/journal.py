@@ -0,0 +1,131 @@
+"""
+Undo and redo of record edits. Every step keeps the changed cells only, as
+(row, field, old value, new value), and the journal drops its oldest steps
+when their estimated size goes over a limit.
+"""
+import sys
+
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_LIMIT = 16 * 1024 * 1024
+CHANGE_SIZE = 120
+
+Change = Tuple[int, str, Any, Any]
+
+
+def value_size(value: Any) -> int:
+    """Size of a value not shared with other records. Small ints, None and
+    booleans are shared by the interpreter."""
+    if value is None or isinstance(value, bool) or (isinstance(value, int) and -5 <= value <= 256):
+        return 0
+
+    return sys.getsizeof(value)
+
+
+@dataclass
+class Step:
+    """Changes undone or redone together."""
+    label: str
+    changes: List[Change] = field(default_factory=list)
+    size: int = 0
+
+    def add(self, row: int, name: str, old: Any, new: Any) -> None:
+        self.changes.append((row, name, old, new))
+        self.size += CHANGE_SIZE + value_size(old) + value_size(new)
+
+    def values(self, undo: bool) -> Dict[str, Dict[int, Any]]:
+        """The values to set per field, old values when undoing."""
+        values: Dict[str, Dict[int, Any]] = {}
+        changes = reversed(self.changes) if undo else self.changes
+        for row, name, old, new in changes:
+            values.setdefault(name, {})[row] = old if undo else new
+
+        return values
+
+
+class EditJournal:
+    """Undo and redo stacks of steps. Changes recorded inside group() are
+    joined into one step. Size is the estimated size of both stacks."""
+    def __init__(self, limit: int = DEFAULT_LIMIT):
+        self.limit = limit
+        self.size = 0
+        self._undo: Deque[Step] = deque()
+        self._redo: List[Step] = []
+        self._group: Optional[Step] = None
+        self._depth = 0
+
+    @contextmanager
+    def group(self, label: str) -> Iterator[Step]:
+        """Join the changes recorded inside the block into one step. Nested
+        groups join the outer group."""
+        if self._depth == 0:
+            self._group = Step(label)
+
+        self._depth += 1
+        try:
+            yield self._group
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                step, self._group = self._group, None
+                self._push(step)
+
+    def record(self, label: str, changes: List[Change]) -> None:
+        """Record changes as a step, or as part of the open group."""
+        with self.group(label) as step:
+            for row, name, old, new in changes:
+                if old != new or type(old) is not type(new):
+                    step.add(row, name, old, new)
+
+    def _push(self, step: Step) -> None:
+        if not step.changes:
+            return
+
+        self.size += step.size - sum(undone.size for undone in self._redo)
+        self._undo.append(step)
+        self._redo = []
+
+        while self.size > self.limit and self._undo:
+            self.size -= self._undo.popleft().size
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo_label(self) -> Optional[str]:
+        return self._undo[-1].label if self._undo else None
+
+    def redo_label(self) -> Optional[str]:
+        return self._redo[-1].label if self._redo else None
+
+    def undo(self) -> Optional[Step]:
+        """Move the last step to the redo stack and return it, for the
+        caller to set its old values."""
+        if not self._undo:
+            return None
+
+        step = self._undo.pop()
+        self._redo.append(step)
+        return step
+
+    def redo(self) -> Optional[Step]:
+        """Move the last undone step back and return it, for the caller to
+        set its new values."""
+        if not self._redo:
+            return None
+
+        step = self._redo.pop()
+        self._undo.append(step)
+        return step
+
+    def clear(self) -> None:
+        self._undo = deque()
+        self._redo = []
+        self.size = 0
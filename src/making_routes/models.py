@@ -1,41 +1,67 @@
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal
 from PySide6.QtCore import QAbstractTableModel, QModelIndex
-from PySide6.QtWidgets import QTableView
+from PySide6.QtGui import QKeySequence
+from PySide6.QtWidgets import QApplication, QTableView, QVBoxLayout, QWidget
 
 from many_more_routes.ducks import OutputRecord
 
-from typing import Any, List, Dict, Optional
-from pydantic import BaseModel
-from pydantic import PrivateAttr
+from operator import attrgetter
+from typing import Any, Iterable, List, Dict, Optional, Sequence, Set, Tuple
 
+from .records import SimpleErrorModel
+from .records import SimpleValidationModel
+from . import validation
+from .clipboard import format_table, parse_table
+from .journal import DEFAULT_LIMIT as JOURNAL_LIMIT
+from .journal import EditJournal
+from .search import RecordIndex, text_key
+from .store import CompactRecords, Splices, set_field_values, splice_records
 
-class SimpleErrorModel(BaseModel):
-    """A data model that can be has the same signature as a Output Record.
-    This facilitets the use for the OutputRecordModel for error messages"""
-    _api: str = PrivateAttr(default='PROCESSING_ERROR')
-    message: str
-
-class SimpleValidationModel(BaseModel):
-    """A data model that can be has the same signature as a Output Record.
-    This facilitets the use for the OutputRecordModel for error messages"""
-    _api: str = PrivateAttr(default='VALIDATION_ERROR')
-    message: str
+FETCH_SIZE = 1000
 
+ALIGN_LEFT = Qt.AlignLeft | Qt.AlignVCenter
+ALIGN_RIGHT = Qt.AlignRight | Qt.AlignVCenter
+NUMERIC_TYPES = ('integer', 'number')
 
 
 class OutputRecordModel(QAbstractTableModel):
-    def __init__(self, data: List[OutputRecord], schema: dict = None, editable: bool = False, parent=None): 
+    """Table model for a list of records. Rows are exposed to the view
+    FETCH_SIZE at a time through canFetchMore/fetchMore, so large
+    lists display without laying out every row up front. Column names,
+    accessors and alignments are computed once per schema, so display
+    values are read straight from the records. With compact set the records
+    are stored as tuples of values and only materialized when read.
+
+    Rows can be filtered and sorted through column indexes, the model then
+    shows a subset of the records in another order. Rows passed to the
+    record methods are always positions in the list of records.
+
+    Edits are kept in a journal of changed cells, up to journal_limit
+    bytes, for undo and redo."""
+    def __init__(self, data: List[OutputRecord], schema: dict = None, editable: bool = False, compact: bool = False, parent=None, journal_limit: int = JOURNAL_LIMIT): 
         QAbstractTableModel.__init__(self, parent=parent)
 
         if schema:
-            self._schema = schema
+            self._set_schema(schema)
         else:
             try:
-                self._schema = data[0].schema()
+                self._set_schema(data[0].schema())
             except:
-                self._schema = {'properties': {'': None}}
+                self._set_schema({'properties': {'': None}})
         
-        self._data = data.copy()
+        if compact:
+            self._data = data if isinstance(data, CompactRecords) else CompactRecords(data)
+        else:
+            self._data = list(data)
+        self.compact = compact
+        self._fetched = min(len(self._data), FETCH_SIZE)
+        self._rows: Optional[List[int]] = None
+        self._positions: Optional[Dict[int, int]] = None
+        self._filter: Optional[Tuple[str, str, bool]] = None
+        self._sort: Optional[Tuple[str, bool]] = None
+        self.indexes = RecordIndex(self._value, lambda: len(self._data))
+        self.dirty: Set[int] = set()
+        self.journal = EditJournal(journal_limit)
         self.editable = editable
 
     def flags(self, index):
@@ -45,22 +71,173 @@ class OutputRecordModel(QAbstractTableModel):
             return Qt.ItemIsEnabled | Qt.ItemIsSelectable
     
     def rowCount(self, parent=QModelIndex()) -> int:
-        return len(self._data)
+        if parent.isValid():
+            return 0
+
+        return self._fetched
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        if parent.isValid():
+            return False
+
+        return self._fetched < self._total()
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        if parent.isValid():
+            return
+
+        self._expose(self._fetched + FETCH_SIZE)
+
+    def _total(self) -> int:
+        return len(self._data) if self._rows is None else len(self._rows)
+
+    def _source(self, row: int) -> int:
+        """Position in the records of a row shown by the model."""
+        return row if self._rows is None else self._rows[row]
+
+    def _expose(self, count: int) -> None:
+        last = min(count, self._total())
+        if last <= self._fetched:
+            return
+
+        self.beginInsertRows(QModelIndex(), self._fetched, last - 1)
+        self._fetched = last
+        self.endInsertRows()
+
+    def _set_schema(self, schema: dict) -> None:
+        self._schema = schema
+        self._columns: Tuple[str, ...] = tuple(schema['properties'].keys())
+        self._getters = tuple(attrgetter(column) if column else None for column in self._columns)
+        self._alignments = tuple(
+            ALIGN_RIGHT if (schema['properties'][column] or {}).get('type') in NUMERIC_TYPES else ALIGN_LEFT
+            for column in self._columns
+        )
+
+    def _value(self, row: int, name: str) -> Any:
+        """Value of a field of the record at a position."""
+        if self.compact:
+            return self._data.value(row, name)
+
+        return getattr(self._data[row], name)
+
+    def _shown_row(self, row: int) -> Optional[int]:
+        """Row showing the record at a position, None if it is not shown."""
+        if self._rows is None:
+            shown = row
+        else:
+            if self._positions is None:
+                self._positions = {position: n for n, position in enumerate(self._rows)}
+            shown = self._positions.get(row)
+
+        return shown if shown is not None and shown < self._fetched else None
+
+    def reveal(self, row: int) -> Optional[int]:
+        """Row showing the record at a position, fetching the rows up to it.
+        None if the record is filtered out."""
+        if self._rows is None:
+            shown = row if row < len(self._data) else None
+        else:
+            if self._positions is None:
+                self._positions = {position: n for n, position in enumerate(self._rows)}
+            shown = self._positions.get(row)
+
+        if shown is not None:
+            self._expose(shown + 1)
+
+        return shown
+
+    def _row_changed(self, row: int) -> None:
+        """Update the view and indexes after the record at a position changed."""
+        self.indexes.update(row)
+
+        shown = self._shown_row(row)
+        if shown is not None:
+            self.dataChanged.emit(self.index(shown, 0), self.index(shown, self.columnCount() - 1))
+
+    def _matches(self, row: int) -> bool:
+        if self._filter is None:
+            return True
+
+        name, text, prefix = self._filter
+        value = text_key(self._value(row, name))
+
+        return value.startswith(text_key(text)) if prefix else value == text_key(text)
+
+    def _shown(self) -> Optional[List[int]]:
+        """Rows to show for the filter and sort order, None for all rows."""
+        rows = None
+        if self._filter is not None:
+            name, text, prefix = self._filter
+            rows = self.indexes.prefix(name, text) if prefix else self.indexes.equal(name, text)
+
+        if self._sort is not None:
+            name, descending = self._sort
+            rows = self.indexes.order(name, rows, descending)
+
+        return rows
+
+    def _apply(self) -> None:
+        self.beginResetModel()
+        self._rows = self._shown()
+        self._positions = None
+        self._fetched = min(FETCH_SIZE, self._total())
+        self.endResetModel()
+
+    def set_filter(self, column: Optional[str], text: str = '', prefix: bool = False) -> int:
+        """Show only the rows where the column equals text, or starts with
+        text when prefix is set, ignoring case. Clears the filter when
+        column is None. Returns the number of matching rows."""
+        if column is not None and column not in self._columns:
+            raise ValueError(f"No column named {column}")
+
+        self._filter = None if column is None else (column, text, prefix)
+        self._apply()
+
+        return self._total()
+
+    def sort(self, column: int, order=Qt.AscendingOrder) -> None:
+        if 0 <= column < len(self._columns) and self._columns[column]:
+            self._sort = (self._columns[column], order == Qt.DescendingOrder)
+        else:
+            self._sort = None
+
+        self._apply()
 
     def columnCount(self, parent=QModelIndex()) -> int: 
-        return len(self._schema['properties'].keys())
+        return len(self._columns)
 
     def data(self, index, role=Qt.DisplayRole):
-        if role != Qt.DisplayRole:
-            return None
-
         if not index.isValid():
             return None
 
-        try:
-            return getattr(self._data[index.row()], list(self._schema['properties'].keys())[index.column()])
-        except AttributeError:
-            return None
+        row = self._source(index.row())
+
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            getter = self._getters[index.column()]
+            try:
+                if getter is None:
+                    value = None
+                elif self.compact:
+                    value = self._data.value(row, self._columns[index.column()])
+                else:
+                    value = getter(self._data[row])
+            except AttributeError:
+                value = None
+
+            return value
+
+        if role == Qt.TextAlignmentRole:
+            return self._alignments[index.column()]
+
+        if role == Qt.ToolTipRole:
+            column = self._columns[index.column()]
+            messages = [
+                error['msg'] for error in validation.errors(self._data[row])
+                if error['loc'] and error['loc'][0] == column
+            ]
+            return '\n'.join(messages) if messages else None
+
+        return None
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         if role != Qt.DisplayRole:
@@ -68,13 +245,13 @@ class OutputRecordModel(QAbstractTableModel):
 
         if orientation == Qt.Horizontal:
             try:
-                return list(self._schema['properties'].keys())[section]
+                return self._columns[section]
             except (IndexError, ):
                 return None
         elif orientation == Qt.Vertical:
             try:
                 # return self.df.index.tolist()
-                return section
+                return self._source(section)
             except (IndexError, ):
                 return None
 
@@ -83,48 +260,186 @@ class OutputRecordModel(QAbstractTableModel):
             # PyQt4 gets a QVariant
             value = value.toPyObject()
 
-        if value == '':
-            value = None
+        column = self._columns[index.column()]
+        self.set_cells({(self._source(index.row()), column): value}, f'Edit {column}')
 
-        record = self._data[index.row()]
-        setattr(record, self.headerData(index.column(), Qt.Horizontal), value)
+        return True
 
-        try:
-            new_record = type(record)(**record.dict())
-            self._data[index.row()] = new_record
-        except:
-            new_record = type(record).construct(**record.dict())
-            self._data[index.row()] = new_record
+    def set_cells(self, cells: Dict[Tuple[int, str], Any], label: str = 'Edit cells') -> int:
+        """Set the values of cells given by (position, field) as one step
+        of the journal. Each changed record is validated once and the view
+        is updated once. Empty strings are set as None. Returns the number
+        of changed records."""
+        fields: Dict[int, Dict[str, Any]] = {}
+        for (row, name), value in cells.items():
+            fields.setdefault(row, {})[name] = None if value == '' else value
 
-        
-        return True
+        changes = []
+        for row, values in fields.items():
+            record = self._data[row]
+            data = record.dict()
+            data.update(values)
+
+            self._data[row] = validation.validate(type(record), data)[0]
+            changes.extend(self._changes(row, record, self._data[row]))
+            self.dirty.add(row)
+
+        self.journal.record(label, changes)
+        self.indexes.update_rows(fields.keys())
+
+        shown = [row for row in map(self._shown_row, fields) if row is not None]
+        if shown:
+            self.dataChanged.emit(self.index(min(shown), 0), self.index(max(shown), self.columnCount() - 1))
+
+        return len(fields)
+
+    def append_records(self, records: Iterable[OutputRecord]) -> int:
+        """Add the records at the end of the model as a single batch. Only
+        the first FETCH_SIZE rows are shown at once, the rest are fetched
+        by the view when needed. Returns the number of added records."""
+        count = len(self._data)
+        self._data.extend(records)
+        self.indexes.append()
+
+        if self._sort is not None:
+            self._apply()
+
+        elif self._filter is not None:
+            self._rows.extend(row for row in range(count, len(self._data)) if self._matches(row))
+            self._positions = None
+
+        self._expose(FETCH_SIZE)
+
+        return len(self._data) - count
+
+    def replace_records(self, replacements: Splices) -> None:
+        """Replace groups of (old, new) records, the old records given as
+        Rows of positions. New records take the place of the old records of
+        the same group, groups without old records are added at the end.
+        When every group keeps its number of records they are replaced in
+        place, otherwise the model is reset."""
+        positions = [[position for rows in old for position in range(rows.start, rows.stop)] for old, new in replacements]
+
+        if all(len(group) == len(new) for group, (old, new) in zip(positions, replacements)):
+            for group, (old, new) in zip(positions, replacements):
+                for position, record in zip(group, new):
+                    self._data[position] = record
+                    self._row_changed(position)
+            self.journal.clear()
+            return
+
+        if self.compact:
+            data = self._data.splice(replacements)
+        else:
+            data = splice_records(self._data, replacements)
+
+        self.beginResetModel()
+        self._data = data
+        self.journal.clear()
+        self.indexes.clear()
+        self._rows = self._shown()
+        self._positions = None
+        self._fetched = min(max(self._fetched, FETCH_SIZE), self._total())
+        self.endResetModel()
+
+    def _changes(self, row: int, old: OutputRecord, new: OutputRecord) -> List[Tuple[int, str, Any, Any]]:
+        """Changed fields of a record replaced by another."""
+        return [
+            (row, name, getattr(old, name, None), getattr(new, name, None))
+            for name in type(new).__fields__
+        ]
+
+    def update_record(self, index: int, record: OutputRecord) -> None:
+        self.journal.record('Update record', self._changes(index, self._data[index], record))
+        self._data[index] = record
+        self.dirty.add(index)
+        self._row_changed(index)
+
+    def update_values(self, name: str, values: Dict[int, Any], label: Optional[str] = None) -> None:
+        """Set a field of the records at the given positions as one step of
+        the journal. The view is updated once for all of them."""
+        self.journal.record(label or f'Set {name}', [(row, name, self._value(row, name), value) for row, value in values.items()])
+        self._set_values(name, values)
+
+    def undo(self) -> Optional[str]:
+        """Set the old values of the last journal step. Returns its label,
+        None when there is nothing to undo."""
+        step = self.journal.undo()
+        if step is None:
+            return None
+
+        for name, values in step.values(undo=True).items():
+            self._set_values(name, values)
+
+        return step.label
+
+    def redo(self) -> Optional[str]:
+        """Set the new values of the last undone step. Returns its label,
+        None when there is nothing to redo."""
+        step = self.journal.redo()
+        if step is None:
+            return None
+
+        for name, values in step.values(undo=False).items():
+            self._set_values(name, values)
+
+        return step.label
+
+    def _set_values(self, name: str, values: Dict[int, Any]) -> None:
+        set_field_values(self._data, name, values)
+
+        column = self._columns.index(name) if name in self._columns else None
+        shown = []
+        for row in values:
+            self.dirty.add(row)
+
+            view_row = self._shown_row(row)
+            if view_row is not None:
+                shown.append(view_row)
+
+        self.indexes.update_rows(values.keys(), name)
+
+        if shown and column is not None:
+            self.dataChanged.emit(self.index(min(shown), column), self.index(max(shown), column))
+
+    def take_dirty(self) -> Set[int]:
+        """Returns the rows edited since the last call and clears them."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
 
 
 class OutputRecordView(QTableView):
-    def __init__(self, data: List[OutputRecord], editable: bool = False):
+    def __init__(self, data: List[OutputRecord], editable: bool = False, compact: bool = False):
         super().__init__()
         self.record_type = data[0]._api
         self.editable = editable
+        self.compact = compact
         self.load(data)
+        self.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.setSortingEnabled(True)
         
     def load(self, data: List[OutputRecord]) -> None:
-        self.model = OutputRecordModel(data, editable=self.editable)
+        self.model = OutputRecordModel(data, editable=self.editable, compact=self.compact)
         self.setModel(self.model)
         self.viewport().update()
 
     def update(self, index: int, data: OutputRecord) -> None:
-        self.model._data[index] = data
-        self.viewport().update()
+        self.model.update_record(index, data)
+
+    def update_values(self, name: str, values: Dict[int, Any]) -> None:
+        self.model.update_values(name, values)
+
+    def replace_records(self, replacements: Splices) -> None:
+        self.model.replace_records(replacements)
 
     def append(self, data: OutputRecord) -> None:
-        _data = self.model._data.copy()
-        _data.append(data)
-        self.model = OutputRecordModel(_data, editable=self.editable)
-        self.setModel(self.model)
-        self.viewport().update()
+        self.append_records([data])
+
+    def append_records(self, data: Iterable[OutputRecord]) -> int:
+        return self.model.append_records(data)
 
     def clear(self):
-        self.model = OutputRecordModel([], editable=self.editable, schema=self.model._schema)
+        self.model = OutputRecordModel([], editable=self.editable, compact=self.compact, schema=self.model._schema)
         self.setModel(self.model)
         self.viewport().update()
 
@@ -134,5 +449,222 @@ class OutputRecordView(QTableView):
     def get(self) -> List[OutputRecord]:
         return self.model._data
 
+    def search(self, query: str) -> int:
+        """Filter the rows with a query like COLUMN=value, or COLUMN=val*
+        to match the start of the values. An empty query shows all rows.
+        Returns the number of shown rows."""
+        query = query.strip()
+        if not query:
+            return self.model.set_filter(None)
+
+        column, separator, text = query.partition('=')
+        if not separator:
+            raise ValueError(f"Search for COLUMN=value, got {query}")
+
+        column = column.strip()
+        for name in self.model._columns:
+            if name.casefold() == column.casefold():
+                column = name
+                break
+
+        text = text.strip()
+        prefix = text.endswith('*')
+
+        return self.model.set_filter(column, text.rstrip('*') if prefix else text, prefix)
+
+    def show_record(self, row: int) -> bool:
+        """Select and scroll to the record at a position, clearing the
+        search if it hides the record. Returns False if there is no such
+        record."""
+        shown = self.model.reveal(row)
+        if shown is None and self.model._filter is not None:
+            self.model.set_filter(None)
+            shown = self.model.reveal(row)
+
+        if shown is None:
+            return False
+
+        self.selectRow(shown)
+        self.scrollTo(self.model.index(shown, 0))
+        return True
+
     def toggle_editable(self):
         self.model.editable = not self.model.editable
+
+    def keyPressEvent(self, event) -> None:
+        if event.matches(QKeySequence.Copy):
+            self.copy()
+        elif event.matches(QKeySequence.Paste):
+            self.paste()
+        elif event.matches(QKeySequence.Delete) and self.state() != QTableView.EditingState:
+            self.set_selected(None)
+        elif event.key() == Qt.Key_D and event.modifiers() == Qt.ControlModifier:
+            self.fill_down()
+        else:
+            super().keyPressEvent(event)
+
+    def _selected(self) -> Dict[int, List[int]]:
+        """Selected columns of each selected row of the view."""
+        cells: Dict[int, List[int]] = {}
+        for index in self.selectionModel().selectedIndexes():
+            cells.setdefault(index.row(), []).append(index.column())
+
+        return cells
+
+    def copy(self) -> int:
+        """Copy the selected cells as tab separated text, one line per row
+        from the first to the last selected column. Returns the number of
+        copied rows."""
+        cells = self._selected()
+        if not cells:
+            return 0
+
+        columns = range(min(map(min, cells.values())), max(map(max, cells.values())) + 1)
+        rows = [
+            [self.model._value(self.model._source(row), self.model._columns[column]) if column in cells[row] else None for column in columns]
+            for row in sorted(cells)
+        ]
+        QApplication.clipboard().setText(format_table(rows))
+
+        return len(rows)
+
+    def paste(self, text: Optional[str] = None) -> int:
+        """Set cells from tab separated text, the clipboard by default,
+        starting at the first selected cell. A single value is set in every
+        selected cell. Returns the number of changed records."""
+        if not self.model.editable:
+            return 0
+
+        table = parse_table(QApplication.clipboard().text() if text is None else text)
+        selected = self._selected()
+        if not table or not selected:
+            return 0
+
+        if len(table) == 1 and len(table[0]) == 1 and sum(map(len, selected.values())) > 1:
+            return self.set_selected(table[0][0])
+
+        first_row = min(selected)
+        first_column = min(selected[first_row])
+        rows = range(first_row, min(first_row + len(table), self.model._total()))
+        columns = self.model._columns
+
+        return self.model.set_cells({
+            (self.model._source(row), columns[first_column + n]): value
+            for row, values in zip(rows, table)
+            for n, value in enumerate(values[:len(columns) - first_column])
+            if columns[first_column + n]
+        }, 'Paste')
+
+    def fill_down(self) -> int:
+        """Set the selected cells of each column to the value of its first
+        selected cell. Returns the number of changed records."""
+        if not self.model.editable:
+            return 0
+
+        first: Dict[int, Any] = {}
+        cells: Dict[Tuple[int, str], Any] = {}
+        for row, columns in sorted(self._selected().items()):
+            for column in columns:
+                name = self.model._columns[column]
+                if column not in first:
+                    first[column] = self.model._value(self.model._source(row), name)
+                else:
+                    cells[(self.model._source(row), name)] = first[column]
+
+        return self.model.set_cells(cells, 'Fill down')
+
+    def set_selected(self, value: Any) -> int:
+        """Set every selected cell to a value. Returns the number of changed
+        records."""
+        if not self.model.editable:
+            return 0
+
+        return self.model.set_cells({
+            (self.model._source(row), self.model._columns[column]): value
+            for row, columns in self._selected().items()
+            for column in columns
+        }, 'Set cells' if value is not None else 'Clear cells')
+
+
+class LazyRecordView(QWidget):
+    """Tab for the records of a view. The records are kept as plain storage
+    and the table is only created the first time the tab is shown, after
+    which every call goes to the table. Double clicking a row emits
+    recordActivated with the position of its record."""
+    recordActivated = Signal(int)
+
+    def __init__(self, data: Sequence[OutputRecord], editable: bool = False, compact: bool = False):
+        super().__init__()
+        self.record_type = data[0]._api
+        self.editable = editable
+        self.compact = compact
+        self.table: Optional[OutputRecordView] = None
+
+        if compact:
+            self._records = data if isinstance(data, CompactRecords) else CompactRecords(data)
+        else:
+            self._records = list(data)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def widget(self) -> OutputRecordView:
+        """The table of the view, created when first needed."""
+        if self.table is None:
+            self.table = OutputRecordView(self._records, editable=self.editable, compact=self.compact)
+            self._records = None
+            self.layout().addWidget(self.table)
+            self.table.doubleClicked.connect(lambda index: self.recordActivated.emit(self.table.model._source(index.row())))
+
+        return self.table
+
+    @property
+    def model(self) -> OutputRecordModel:
+        return self.widget().model
+
+    def showEvent(self, event) -> None:
+        self.widget()
+        super().showEvent(event)
+
+    def update(self, index: int, data: OutputRecord) -> None:
+        if self.table is not None:
+            self.table.update(index, data)
+        else:
+            self._records[index] = data
+
+    def update_values(self, name: str, values: Dict[int, Any]) -> None:
+        if self.table is not None:
+            self.table.update_values(name, values)
+        else:
+            set_field_values(self._records, name, values)
+
+    def replace_records(self, replacements: Splices) -> None:
+        if self.table is not None:
+            self.table.replace_records(replacements)
+        elif isinstance(self._records, CompactRecords):
+            self._records = self._records.splice(replacements)
+        else:
+            self._records = splice_records(self._records, replacements)
+
+    def append(self, data: OutputRecord) -> None:
+        self.append_records([data])
+
+    def append_records(self, data: Iterable[OutputRecord]) -> int:
+        if self.table is not None:
+            return self.table.append_records(data)
+
+        count = len(self._records)
+        self._records.extend(data)
+        return len(self._records) - count
+
+    def list(self) -> List[OutputRecord]:
+        return self.get().copy()
+
+    def get(self) -> List[OutputRecord]:
+        return self.table.get() if self.table is not None else self._records
+
+    def search(self, query: str) -> int:
+        return self.widget().search(query)
+
+    def show_record(self, row: int) -> bool:
+        return self.widget().show_record(row)
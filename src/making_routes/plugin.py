@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Callable, List, Literal, Tuple, Any, ForwardRef
+from typing import Callable, Dict, Iterable, List, Literal, Optional, Sequence, Tuple, Any, ForwardRef, Union
 from many_more_routes.models import UnvalidatedTemplate
 from many_more_routes.models import ValidatedTemplate
 from many_more_routes.ducks import OutputRecord
@@ -9,19 +9,31 @@ from dataclasses import dataclass
 Plugin = ForwardRef('Plugin')
 
 
+class Cancelled(Exception):
+    """
+    Raised by report_progress when the user has cancelled the running job.
+    """
+
+
 @dataclass
 class Button:
     """
     Button object. Call a function (callback) at the press of a button. 
+    Set background to run the callback on a worker thread. Background
+    callbacks must not prompt the user.
     """
     name: str
     callback: Callable
+    background: bool = False
 
 
 @dataclass
 class Trigger:
     """
     Trigger object. Call a function (callback) at a given event.
+    Declare the views the callback reads and writes, or '*' for all, to
+    let it run at the same time as other triggers of the event. Such a
+    callback must only use the interface, and must not prompt the user.
     """
     event: Literal[
         'ON_LOAD',
@@ -30,6 +42,8 @@ class Trigger:
         'ON_PROCESS'
     ]
     callback: Callable
+    reads: Optional[Tuple[str, ...]] = None
+    writes: Optional[Tuple[str, ...]] = None
 
 
 class PluginInterfaceBase(ABC):
@@ -40,7 +54,22 @@ class PluginInterfaceBase(ABC):
     @abstractmethod
     def list_records() -> List[UnvalidatedTemplate|ValidatedTemplate]|None:
         """
-        Returns a list of records from the template.
+        Returns a copy of the records from the template.
+        """
+
+    @abstractmethod
+    def records(self, model: Union[int, str] = 0) -> Sequence[OutputRecord]:
+        """
+        Returns a read-only sequence over the records of a model, without
+        copying them. Slices are sequences over the same records. Records
+        must not be changed in place, use update_record or update_values.
+        """
+
+    @abstractmethod
+    def record_rows(self, models: Union[str, Sequence[str], None] = None) -> Iterable[Tuple[int, OutputRecord]]:
+        """
+        Returns (index, record) pairs of the given models, or of all models,
+        without copying them. The result has a len() for progress reports.
         """
 
     @staticmethod
@@ -50,12 +79,49 @@ class PluginInterfaceBase(ABC):
         Update a record at a given index.
         """
 
+    @abstractmethod
+    def list_values(self, name: str, model: Union[int, str, None] = 0) -> List[Any]:
+        """
+        Returns a field of every record in a model, or of all models when
+        model is None. Records without the field give None.
+        """
+
+    @abstractmethod
+    def update_values(self, name: str, values: Dict[int, Any], model: Union[int, str] = 0) -> None:
+        """
+        Set a field of the records at the given indexes in a single batch.
+        """
+
     @abstractmethod
     def append_record(record: OutputRecord) -> None:
         """
         Add a new record to the list.
         """
 
+    @abstractmethod
+    def append_records(records: Iterable[OutputRecord]) -> None:
+        """
+        Add several records in one batch. Records are grouped by api
+        and each view is updated once. Issues among the records are
+        added to the error report.
+        """
+
+    @abstractmethod
+    def clear_issues(self, kind: Optional[str] = None) -> None:
+        """
+        Remove the issues of a kind, or all issues, from the error report.
+        """
+
+    @abstractmethod
+    def replace_records(self, replacements: Sequence[Tuple[Sequence[Any], Sequence[Any]]]) -> None:
+        """
+        Replace groups of (old, new) records. Old records are given by
+        position as store.Rows(api, start, stop), all positions counted
+        before any replacement, together with the old issues. The new
+        records take the place of the old rows in their views, an empty
+        range is where to insert them.
+        """
+
     @staticmethod
     @abstractmethod
     def prompt_error(error_message: str) -> None:
@@ -63,6 +129,13 @@ class PluginInterfaceBase(ABC):
         Prompt with a error message.
         """
 
+    @abstractmethod
+    def report_progress(self, current: int, total: int, message: str = '') -> None:
+        """
+        Report progress of a long running callback. Raises Cancelled if the
+        user has cancelled the job, which stops the callback.
+        """
+
     @staticmethod
     @abstractmethod
     def prompt(header: str, message: str,  text: str) -> Tuple[Any, Any]:
@@ -85,9 +158,10 @@ class PluginInterfaceBase(ABC):
         """
 
     @abstractmethod
-    def list_all_records(self) -> List[OutputRecord]:
+    def list_all_records(self) -> List[Tuple[int, OutputRecord]]:
         """
-        List all records.
+        List (index, record) pairs of all records. Use record_rows to
+        iterate without building the list.
         """
 
     @abstractmethod
@@ -2,10 +2,14 @@ from __future__ import annotations
 
 from pydantic import ValidationError
 
-from making_routes.models import SimpleErrorModel, SimpleValidationModel
+from ..engine import WILDCARD
+from ..report import Issue, processing_issue, validation_issue
+from ..store import Provenance
+from .. import validation
 
 from ..plugin import Plugin
 from ..plugin import Button
+from ..plugin import Cancelled
 from ..plugin import Trigger
 
 from route_sequence import RouteSequence
@@ -15,8 +19,47 @@ from many_more_routes.construct import MakeDeparture
 from many_more_routes.construct import MakeSelection
 from many_more_routes.construct import MakeCustomerExtension
 from many_more_routes.construct import MakeCustomerExtensionExtended
+from many_more_routes.ducks import OutputRecord
+from many_more_routes.models import ValidatedTemplate
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NewType, Optional, Sequence, Tuple, get_args, get_type_hints
+
+PROGRESS_INTERVAL = 500
+
+ROUTE_COUNT = 6760000
+
+
+def assign_routes(routes: Sequence[Any], seed: str, used: Iterable[Any] = ()) -> Dict[int, str]:
+    """Routes for the rows without one, counting up from the seed and
+    skipping routes in use. Returns the new route per row index."""
+    taken = {RouteSequence.to_int(route) for route in set(used) | set(routes) if RouteSequence.is_valid_str(route)}
+    number = RouteSequence.to_int(seed)
+
+    assigned = {}
+    for index, route in enumerate(routes):
+        if route:
+            continue
+
+        while number in taken:
+            number += 1
+
+        if number >= ROUTE_COUNT:
+            raise ValueError(f'No free routes left after {seed}, {len(assigned)} routes assigned')
+
+        assigned[index] = RouteSequence.to_str(number)
+        number += 1
+
+    return assigned
+
+
+def next_route(used: Iterable[Any]) -> str:
+    """The route after the highest valid route in use, or an empty string."""
+    numbers = [RouteSequence.to_int(route) for route in set(used) if RouteSequence.is_valid_str(route)]
+    if not numbers or max(numbers) + 1 >= ROUTE_COUNT:
+        return ''
+
+    return RouteSequence.to_str(max(numbers) + 1)
 
-from typing import Callable, List, NewType
 
 class AssignRoutes(Plugin):
     enabled = True
@@ -24,25 +67,63 @@ class AssignRoutes(Plugin):
     def buttons(self) -> List[Button]:
         return [Button(name='Assign Routes', callback=self.main)]
 
-    def main(self, *args, **kwargs) -> None:
+    def main(self, *args, **kwargs) -> int:
+        """Assign routes to the template rows without one. Routes used in the
+        template or any output are skipped. Returns the number of assigned
+        routes."""
         interface = self.interface
 
-        records = interface.list_records()
         try:
-            seed = str(RouteSequence(max(list(filter(lambda x: RouteSequence.is_valid_str(x), [r.ROUT for r in records])))) + 1)
-        except:
-            seed = ''
+            routes = interface.list_values('ROUT', 'TEMPLATE_V3')
+        except ValueError as error:
+            interface.prompt_error(str(error))
+            return 0
+
+        used = interface.list_values('ROUT', None)
+
+        text, ok = interface.prompt(header='Route Seed', message='Set seed', text=next_route(used))
 
-        text, ok = interface.prompt(header='Route Seed', message='Set seed', text=seed)
-    
         if not RouteSequence.is_valid_str(text) and ok:
             interface.prompt_error(f'Seed {text} is invalid')
-            return
+            return 0
 
         elif ok:
-            for (index, record), route in zip([r for r in enumerate(records) if not getattr(r[1], 'ROUT', None)], RouteSequence(text) - 1):
-                setattr(record, 'ROUT', str(route))
-                interface.update_record(index, record)
+            try:
+                assigned = assign_routes(routes, text, used)
+            except ValueError as error:
+                interface.prompt_error(str(error))
+                return 0
+
+            interface.update_values('ROUT', assigned, 'TEMPLATE_V3')
+            return len(assigned)
+
+        return 0
+
+
+def make_records(make_function: Callable, index: int, record: ValidatedTemplate) -> Iterator[OutputRecord]:
+    """Run a make function for a single template row. Failures are returned
+    as a processing Issue referring to the row index."""
+    try:
+        for result in make_function(record):
+            try:
+                yield type(result)(**result.dict())
+
+            except ValidationError as e:
+                yield type(result).construct(**result.dict())
+
+    except Exception as e:
+        yield processing_issue(index, make_function.__name__, e)
+
+
+def output_apis(make_function: Callable) -> Tuple[str, ...]:
+    """Apis of the records a make function returns, from its return
+    annotation. All apis when it can not be told."""
+    try:
+        model = get_args(get_type_hints(make_function)['return'])[0]
+        return (model.__private_attributes__['_api'].default,)
+
+    except (KeyError, IndexError, AttributeError, TypeError, NameError):
+        return (WILDCARD,)
 
 
 MakeClass = NewType('MakeClass', Plugin)
@@ -50,34 +131,53 @@ def make_plugin_factory(make_funtion: Callable, enable=True) -> MakeClass:
 
     class MakeClass(Plugin):
         enabled = enable
+        make_function = staticmethod(make_funtion)
+        provenance: Optional[Provenance] = None
 
         def triggers(self) -> List[Trigger]:
-            return [Trigger('ON_PROCESS', self.main)]
+            return [Trigger('ON_PROCESS', self.main, reads=('TEMPLATE_V3',), writes=output_apis(make_funtion) + ('PROCESSING_ERROR',))]
 
         def main(self, *args, **kwargs) -> None:
-            for index, record in enumerate(self.interface.list_records('TEMPLATE_V3')):
+            self.provenance = None
+            self.interface.append_records(self.make())
+
+        def make(self) -> Iterator[OutputRecord]:
+            records = self.interface.records('TEMPLATE_V3')
+            provenance = Provenance()
+            for index, record in enumerate(records):
+                if index % PROGRESS_INTERVAL == 0:
+                    self.interface.report_progress(index, len(records), make_funtion.__name__)
+
+                results = list(make_records(make_funtion, index, record))
+                provenance.append(results)
+                yield from results
+
+            self.provenance = provenance
+
+        def updatable(self) -> bool:
+            """True when the views of the outputs hold the outputs made last
+            and nothing else, so they can be replaced by position."""
+            if self.provenance is None:
+                return False
+
+            for api, total in self.provenance.totals().items():
                 try:
-                    for result in make_funtion(record):
-                        try:
-                            self.interface.append_record(
-                                type(result)(
-                                    **result.dict()
-                                )
-                            )
-
-                        except ValidationError as e:
-                            self.interface.append_record(
-                                type(result).construct(
-                                    **result.dict()
-                                )
-                            )
-
-                except Exception as e:
-                    self.interface.append_record(
-                        SimpleErrorModel(
-                            message = f"Error processing row {index}; {make_funtion.__name__}; {str(e.with_traceback(None))}"
-                            )
-                        )
+                    count = len(self.interface.records(api))
+                except ValueError:
+                    count = 0
+
+                if count != total:
+                    return False
+
+            return True
+
+        def update(self, rows: Iterable[int]) -> None:
+            """Regenerate the outputs of the given template rows only."""
+            records = self.interface.records('TEMPLATE_V3')
+            results = {index: list(make_records(make_funtion, index, records[index])) for index in rows}
+            self.interface.replace_records(self.provenance.replacements(results))
+
+    MakeClass.__name__ = MakeClass.__qualname__ = f'{make_funtion.__name__}Plugin'
 
     return MakeClass
 
@@ -92,21 +192,27 @@ class ValidatePlugin(Plugin):
     enabled = True
 
     def buttons(self) -> List[Button]:
-        return [Button('Validate', self.main)]
+        return [Button('Validate', lambda: self.interface.trigger('ON_VALIDATE'), background=True)]
+
+    def triggers(self) -> List[Trigger]:
+        return [Trigger('ON_VALIDATE', self.main, reads=(WILDCARD,), writes=('VALIDATION_ERROR',))]
 
     def main(self) -> None:
         try:
-            for n, record in self.interface.list_all_records():
-                try:
-                    type(record)(**record.dict())
+            self.interface.clear_issues('VALIDATION_ERROR')
+            self.interface.append_records(self.validate())
 
-                except ValidationError as exception:
-                    for error in exception.errors():
-                        self.interface.append_record(
-                            SimpleValidationModel(
-                                message=f"[{record._api}] (Line {n})   {error['loc'][0]} = {getattr(record, error['loc'][0], None)}   {error['msg']}"
-                            )
-                        )
+        except Cancelled:
+            raise
 
         except Exception as exception:
-            self.interface.prompt_error(str(exception))
\ No newline at end of file
+            self.interface.prompt_error(str(exception))
+
+    def validate(self) -> Iterator[Issue]:
+        records = self.interface.record_rows()
+        for count, (n, record) in enumerate(records):
+            if count % PROGRESS_INTERVAL == 0:
+                self.interface.report_progress(count, len(records), 'Validating')
+
+            for error in validation.errors(record):
+                yield validation_issue(record._api, n, record, error)
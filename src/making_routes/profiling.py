@@ -0,0 +1,191 @@
+"""
+Timing and counters for plugin callbacks.
+"""
+import cProfile
+import json
+import threading
+import time
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from many_more_routes.ducks import OutputRecord
+
+from .records import ERROR_APIS
+
+
+@dataclass
+class Measurement:
+    """Time spent and records produced by one or more calls of a plugin."""
+    name: str
+    calls: int = 0
+    seconds: float = 0.0
+    records: int = 0
+    errors: int = 0
+
+    @property
+    def records_per_second(self) -> Optional[float]:
+        return self.records / self.seconds if self.seconds else None
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), 'records_per_second': self.records_per_second}
+
+
+class StartupTimer:
+    """Time from a start to each step of the application start up."""
+    def __init__(self, started: float):
+        self.started = started
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, name: str) -> None:
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self) -> str:
+        lines = []
+        previous = 0.0
+        for name, seconds in self.marks:
+            lines.append(f'{name:<12} {seconds:>7.3f} s  (+{seconds - previous:.3f} s)')
+            previous = seconds
+
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """Measures plugin callbacks. Records appended while a callback is
+    measured are attributed to it. Measurements may be nested, and the
+    records of a measurement include those of the measurements inside it.
+    Measurements on other threads during a profiled callback are nested in
+    it. Set capture to also collect a cProfile of the outermost measured
+    callbacks, which only covers their own thread."""
+    def __init__(self, capture: bool = False):
+        self.capture = capture
+        self.stats: Dict[str, Measurement] = {}
+        self.recent: List[Measurement] = []
+        self.profile: Optional[cProfile.Profile] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._run: Optional[Measurement] = None
+
+    def _stack(self) -> List[Measurement]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def new_run(self) -> None:
+        """Start a new group of recent measurements, unless called from a
+        measured callback."""
+        if self._run is None and not self._stack():
+            self.recent = []
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[Measurement]:
+        measurement = Measurement(name, calls=1)
+        stack = self._stack()
+
+        parent = stack[-1] if stack else self._run
+        capture = self.capture and parent is None
+        if capture and self.profile is None:
+            self.profile = cProfile.Profile()
+
+        stack.append(measurement)
+        start = time.perf_counter()
+        if capture:
+            self.profile.enable()
+
+        try:
+            yield measurement
+
+        finally:
+            if capture:
+                self.profile.disable()
+
+            measurement.seconds = time.perf_counter() - start
+            stack.pop()
+
+            with self._lock:
+                if parent is not None:
+                    parent.records += measurement.records
+                    parent.errors += measurement.errors
+
+                self.recent.append(measurement)
+
+                total = self.stats.setdefault(name, Measurement(name))
+                total.calls += 1
+                total.seconds += measurement.seconds
+                total.records += measurement.records
+                total.errors += measurement.errors
+
+    def profiled(self, name: str, callback: Callable) -> Callable:
+        """Wrap a callback so each call is measured as a new run."""
+        def wrapper(*args):
+            if self._run is not None or self._stack():
+                with self.measure(name):
+                    return callback()
+
+            self.new_run()
+            with self.measure(name) as measurement:
+                self._run = measurement
+                try:
+                    return callback()
+                finally:
+                    self._run = None
+
+        return wrapper
+
+    def count(self, records: Iterable[OutputRecord]) -> Iterator[OutputRecord]:
+        """Pass the records through, counting them for the callback being
+        measured on this thread."""
+        stack = self._stack()
+        if not stack:
+            yield from records
+            return
+
+        measurement = stack[-1]
+
+        for record in records:
+            measurement.records += 1
+            if record._api in ERROR_APIS:
+                measurement.errors += 1
+            yield record
+
+    def add(self, records: int) -> None:
+        """Count records changed by the callback being measured on this thread."""
+        stack = self._stack()
+        if stack:
+            stack[-1].records += records
+
+    def reset(self) -> None:
+        self.stats = {}
+        self.recent = []
+        self.profile = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'plugins': [measurement.to_dict() for measurement in self.stats.values()],
+            'recent': [measurement.to_dict() for measurement in self.recent],
+        }
+
+    def dump(self, path: Union[str, Path]) -> None:
+        """Write the measurements as JSON. A captured cProfile is written
+        next to it with the .prof suffix."""
+        path = Path(path)
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+        if self.profile is not None:
+            self.profile.dump_stats(str(path.with_suffix('.prof')))
+
+    def summary(self) -> str:
+        """One line summary of the recent measurements, slowest first."""
+        parts = []
+        for measurement in sorted(self.recent, key=lambda x: x.seconds, reverse=True):
+            part = f'{measurement.name} {measurement.seconds:.2f} s, {measurement.records} records'
+            if measurement.errors:
+                part += f', {measurement.errors} errors'
+            parts.append(part)
+
+        return '; '.join(parts)
@@ -0,0 +1,46 @@
+"""
+Record types and helpers that do not depend on Qt.
+"""
+from typing import Dict, Optional
+
+from many_more_routes.models import UnvalidatedTemplate
+from many_more_routes.models import ValidatedTemplate
+
+from pydantic import BaseModel
+from pydantic import PrivateAttr
+
+from .validation import validate
+
+
+ERROR_APIS = {'PROCESSING_ERROR', 'VALIDATION_ERROR'}
+
+
+class SimpleErrorModel(BaseModel):
+    """A data model that can be has the same signature as a Output Record.
+    This facilitets the use for the OutputRecordModel for error messages"""
+    _api: str = PrivateAttr(default='PROCESSING_ERROR')
+    message: str
+
+class SimpleValidationModel(BaseModel):
+    """A data model that can be has the same signature as a Output Record.
+    This facilitets the use for the OutputRecordModel for error messages"""
+    _api: str = PrivateAttr(default='VALIDATION_ERROR')
+    message: str
+
+class ErrorSummary(BaseModel):
+    """Number of errors of one kind, api, field and error code, with the
+    first row they occur in."""
+    _api: str = PrivateAttr(default='ERROR_REPORT')
+    kind: str
+    api: str
+    field: Optional[str]
+    code: str
+    message: str
+    count: int
+    row: int
+
+
+def template_record(record: Dict) -> ValidatedTemplate:
+    """Create a template record from a row loaded from excel. Fields that
+    fail validation are kept unvalidated and the errors are remembered."""
+    return validate(ValidatedTemplate, record, fallback=UnvalidatedTemplate)[0]
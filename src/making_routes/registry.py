@@ -0,0 +1,215 @@
+"""
+Plugin discovery. Plugins are the built in plugins and the classes published
+by installed packages under the making_routes.plugins entry point group:
+
+    [project.entry-points."making_routes.plugins"]
+    my_plugin = "my_package.plugins:MyPlugin"
+
+The name, buttons and events of every plugin are kept in a cached manifest,
+so a plugin is only imported and created when one of its buttons is pressed
+or one of its events is triggered. With a cached manifest the installed
+plugins are only discovered when update is called, which makes the manifest
+again when they have changed since. A plugin that fails to load while the
+manifest is made is left out of it and reported in the errors of the
+registry, and the manifest is then not cached so it is tried again.
+"""
+import importlib
+import json
+
+from dataclasses import asdict, dataclass, field
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .plugin import Button, Plugin, PluginInterfaceBase
+
+ENTRY_POINT_GROUP = 'making_routes.plugins'
+MANIFEST_VERSION = 1
+
+BUILTIN_PLUGINS = [
+    'making_routes.plugins.core:AssignRoutes',
+    'making_routes.plugins.core:MakeRoutePlugin',
+    'making_routes.plugins.core:MakeDeparturePlugin',
+    'making_routes.plugins.core:MakeSelectionPlugin',
+    'making_routes.plugins.core:MakeCustomerExtensionPlugin',
+    'making_routes.plugins.core:MakeCustomerExtensionExtendedPlugin',
+    'making_routes.plugins.core:ValidatePlugin',
+]
+
+
+@dataclass
+class PluginEntry:
+    """
+    Manifest entry of a plugin class given by a module:attribute spec.
+    """
+    name: str
+    spec: str
+    enabled: bool = False
+    buttons: List[Tuple[str, bool]] = field(default_factory=list)
+    events: List[str] = field(default_factory=list)
+
+
+def load_class(spec: str) -> type:
+    module, _, name = spec.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def discover(builtin: List[str] = BUILTIN_PLUGINS) -> List[Tuple[str, str]]:
+    """Specs of the built in plugins and of the installed entry points,
+    each with a version string that changes when the plugin may change."""
+    specs = []
+    for spec in builtin:
+        module = find_spec(spec.partition(':')[0])
+        try:
+            stat = Path(module.origin).stat()
+            version = f'{stat.st_mtime_ns}:{stat.st_size}'
+        except (AttributeError, TypeError, OSError):
+            version = ''
+        specs.append((spec, version))
+
+    try:
+        from importlib import metadata as importlib_metadata
+    except ImportError:
+        # Backwards compatibility - importlib.metadata was added in Python 3.8
+        import importlib_metadata
+
+    try:
+        entry_points = importlib_metadata.entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        # Python 3.9 and older return a dict of groups
+        entry_points = importlib_metadata.entry_points().get(ENTRY_POINT_GROUP, [])
+
+    for entry_point in entry_points:
+        dist = getattr(entry_point, 'dist', None)
+        version = f'{dist.name}=={dist.version}' if dist is not None else ''
+        specs.append((entry_point.value, version))
+
+    return specs
+
+
+def describe(plugin: Plugin, spec: str) -> PluginEntry:
+    return PluginEntry(
+        name=type(plugin).__name__,
+        spec=spec,
+        enabled=bool(plugin.enabled),
+        buttons=[(button.name, button.background) for button in plugin.buttons()],
+        events=list(dict.fromkeys(trigger.event for trigger in plugin.triggers())),
+    )
+
+
+class PluginRegistry:
+    """Manifest of the discovered plugins, and the plugins loaded so far.
+    Plugins register themselves to the interface when they are loaded.
+    Errors holds the plugins that failed to load by spec."""
+    def __init__(self, interface: PluginInterfaceBase, cache: Optional[Union[str, Path]] = None, builtin: List[str] = BUILTIN_PLUGINS):
+        self.interface = interface
+        self.cache = Path(cache) if cache is not None else None
+        self.builtin = builtin
+        self.specs: List[Tuple[str, str]] = []
+        self.entries: List[PluginEntry] = []
+        self.loaded: Dict[str, Plugin] = {}
+        self.errors: Dict[str, str] = {}
+
+        if not self._read_cache():
+            self.update()
+
+    def update(self) -> bool:
+        """Discover the plugins, and make the manifest again when they have
+        changed since it was made. Returns True when it was made again."""
+        specs = discover(self.builtin)
+        if specs == self.specs and self.entries:
+            return False
+
+        self.specs = specs
+        self.errors = {}
+        self.entries = [entry for entry in map(self._describe, (spec for spec, version in specs)) if entry is not None]
+        if not self.errors:
+            self._write_cache()
+
+        return True
+
+    def _describe(self, spec: str) -> Optional[PluginEntry]:
+        try:
+            return describe(self._load(spec), spec)
+        except Exception as error:
+            self.errors[spec] = f'{type(error).__name__}: {error}'
+            return None
+
+    def _read_cache(self) -> bool:
+        if self.cache is None:
+            return False
+
+        try:
+            with open(self.cache) as file:
+                manifest = json.load(file)
+
+            if manifest['version'] != MANIFEST_VERSION:
+                return False
+
+            self.entries = [
+                PluginEntry(**{**entry, 'buttons': [tuple(button) for button in entry['buttons']]})
+                for entry in manifest['plugins']
+            ]
+            self.specs = [tuple(spec) for spec in manifest['specs']]
+            return True
+
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = []
+            return False
+
+    def _write_cache(self) -> None:
+        if self.cache is None:
+            return
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'specs': [list(spec) for spec in self.specs],
+            'plugins': [asdict(entry) for entry in self.entries],
+        }
+
+        try:
+            self.cache.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache, 'w') as file:
+                json.dump(manifest, file, indent=2)
+        except OSError:
+            pass
+
+    def _create(self, spec: str) -> Plugin:
+        plugin = load_class(spec)(self.interface)
+        self.loaded[spec] = plugin
+        return plugin
+
+    def _load(self, spec: str) -> Plugin:
+        try:
+            return self.loaded[spec]
+        except KeyError:
+            return self._create(spec)
+
+    def load(self, entry: PluginEntry) -> Plugin:
+        """The plugin of an entry, imported and created when first needed."""
+        return self._load(entry.spec)
+
+    def load_all(self) -> List[Plugin]:
+        return [self.load(entry) for entry in self.entries if entry.enabled]
+
+    def is_loaded(self, entry: PluginEntry) -> bool:
+        return entry.spec in self.loaded
+
+    def button(self, entry: PluginEntry, name: str) -> Callable:
+        """Callback loading the plugin and calling its button with the name."""
+        def callback(*args: Any) -> Any:
+            for button in self.load(entry).buttons():
+                if button.name == name:
+                    return button.callback()
+
+            raise LookupError(f'{entry.name} has no button {name}')
+
+        return callback
+
+    def buttons(self) -> List[Tuple[PluginEntry, Button]]:
+        """Buttons of the enabled plugins, with lazy callbacks."""
+        return [
+            (entry, Button(name, self.button(entry, name), background))
+            for entry in self.entries if entry.enabled
+            for name, background in entry.buttons
+        ]
@@ -0,0 +1,180 @@
+"""
+Structured store of processing and validation errors. Plugins append Issue
+tuples in the record stream, and the record stores move them into an
+ErrorReport instead of keeping one error record per failure. The report
+is indexed by record and by group, and summarised as one ERROR_REPORT row
+per api, field and error code.
+"""
+import threading
+
+from typing import Any, Collection, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from many_more_routes.ducks import OutputRecord
+
+from .records import ErrorSummary
+
+REPORT_API = 'ERROR_REPORT'
+
+GroupKey = Tuple[str, str, Optional[str], str]
+
+
+class Issue(NamedTuple):
+    """A processing or validation error of one record. Row is the position
+    of the record in the view of its api, for processing errors the
+    template row."""
+    kind: str
+    api: str
+    row: int
+    field: Optional[str]
+    value: Any
+    code: str
+    message: str
+
+    @property
+    def _api(self) -> str:
+        return self.kind
+
+    @property
+    def group(self) -> GroupKey:
+        return self.kind, self.api, self.field, self.code
+
+
+def processing_issue(index: int, name: str, error: Exception) -> Issue:
+    """A template row that failed to make its outputs."""
+    return Issue('PROCESSING_ERROR', 'TEMPLATE_V3', index, None, None, f'{name}.{type(error).__name__}', str(error))
+
+
+def validation_issue(api: str, row: int, record: OutputRecord, error: Dict) -> Issue:
+    """A pydantic validation error of a record."""
+    field = str(error['loc'][0]) if error.get('loc') else None
+    value = getattr(record, field, None) if field is not None else None
+    return Issue('VALIDATION_ERROR', api, row, field, value, error.get('type', ''), error['msg'])
+
+
+def split_issues(records: Iterable[Any]) -> Tuple[List[OutputRecord], List[Issue]]:
+    """The records and the issues among them."""
+    kept, issues = [], []
+    for record in records:
+        (issues if isinstance(record, Issue) else kept).append(record)
+
+    return kept, issues
+
+
+def split_replacements(replacements: Iterable[Tuple[Sequence[Any], Sequence[Any]]]) -> Tuple[List[Tuple[List[Any], List[OutputRecord]]], List[Issue], List[Issue]]:
+    """The (old, new) replacements without issues, and the old and new
+    issues that were among them. Old records are given by position, as
+    store.Rows."""
+    kept, old_issues, new_issues = [], [], []
+    for old, new in replacements:
+        old, issues = split_issues(old)
+        old_issues.extend(issues)
+        new, issues = split_issues(new)
+        new_issues.extend(issues)
+        kept.append((old, new))
+
+    return kept, old_issues, new_issues
+
+
+class ErrorReport:
+    """Issues indexed by the record they refer to and by group. Safe to
+    add to from a worker thread while the GUI thread reads."""
+    def __init__(self):
+        self._issues: List[Optional[Issue]] = []
+        self._records: Dict[Tuple[str, int], List[int]] = {}
+        self._groups: Dict[GroupKey, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(positions) for positions in self._groups.values())
+
+    def _add(self, issues: Iterable[Issue]) -> int:
+        count = 0
+        for issue in issues:
+            self._issues.append(issue)
+            self._records.setdefault((issue.api, issue.row), []).append(len(self._issues) - 1)
+            self._groups.setdefault(issue.group, []).append(len(self._issues) - 1)
+            count += 1
+
+        return count
+
+    def add(self, issues: Iterable[Issue]) -> int:
+        with self._lock:
+            return self._add(issues)
+
+    def remove(self, issues: Iterable[Issue]) -> None:
+        with self._lock:
+            for issue in issues:
+                positions = self._records.get((issue.api, issue.row), [])
+                for position in positions:
+                    if self._issues[position] == issue:
+                        break
+                else:
+                    continue
+
+                self._issues[position] = None
+                positions.remove(position)
+                if not positions:
+                    del self._records[(issue.api, issue.row)]
+
+                group = self._groups[issue.group]
+                group.remove(position)
+                if not group:
+                    del self._groups[issue.group]
+
+    def replace(self, old: Sequence[Issue], new: Sequence[Issue]) -> None:
+        self.remove(old)
+        self.add(new)
+
+    def clear(self, kind: Optional[str] = None, apis: Optional[Collection[str]] = None) -> None:
+        """Remove all issues, or the issues of one kind, of every api or of
+        the given apis."""
+        with self._lock:
+            kept = [
+                issue for issue in self._issues
+                if issue is not None and not ((kind is None or issue.kind == kind) and (apis is None or issue.api in apis))
+            ]
+            self._issues = []
+            self._records = {}
+            self._groups = {}
+            self._add(kept)
+
+    def issues(self, kind: Optional[str] = None) -> List[Issue]:
+        with self._lock:
+            return [issue for issue in self._issues if issue is not None and (kind is None or issue.kind == kind)]
+
+    def for_record(self, api: str, row: int) -> List[Issue]:
+        """Issues of the record at a row of an api."""
+        with self._lock:
+            return [self._issues[position] for position in self._records.get((api, row), [])]
+
+    def rows(self, group: GroupKey) -> List[int]:
+        """Rows with an issue of a group, in order."""
+        with self._lock:
+            return sorted({self._issues[position].row for position in self._groups.get(group, [])})
+
+    def counts(self) -> Dict[str, int]:
+        """Number of issues per kind."""
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for (kind, api, field, code), positions in self._groups.items():
+                counts[kind] = counts.get(kind, 0) + len(positions)
+
+        return counts
+
+    def summary(self) -> List[ErrorSummary]:
+        """One record per group, largest groups first."""
+        with self._lock:
+            groups = sorted(self._groups.items(), key=lambda item: len(item[1]), reverse=True)
+            return [
+                ErrorSummary.construct(
+                    kind=kind,
+                    api=api,
+                    field=field,
+                    code=code,
+                    message=self._issues[positions[0]].message,
+                    count=len(positions),
+                    row=min(self._issues[position].row for position in positions),
+                )
+                for (kind, api, field, code), positions in groups
+            ]
@@ -0,0 +1,172 @@
+"""
+Column indexes for searching and sorting records without scanning every row.
+Indexes are built the first time a column is searched or sorted and kept up
+to date as rows are added or changed.
+"""
+from bisect import bisect_left, insort
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+
+REBUILD_FRACTION = 8
+
+
+def text_key(value: Any) -> str:
+    """Text a value is searched by."""
+    return '' if value is None else str(value).casefold()
+
+
+def sort_key(value: Any) -> Tuple:
+    """Orders numbers before text and empty values last."""
+    if value is None:
+        return (2, '')
+
+    if isinstance(value, (int, float)):
+        return (0, value)
+
+    return (1, str(value).casefold())
+
+
+class ColumnIndex:
+    """Index of the values of one column. Maps the text of each value to the
+    rows holding it, and keeps the distinct texts sorted for prefix search."""
+    def __init__(self, values: List[Any]):
+        self._values = values
+        self._rows: Dict[str, List[int]] = {}
+        self._texts: Optional[List[str]] = None
+        self._order: Optional[List[int]] = None
+
+        for row, value in enumerate(values):
+            self._rows.setdefault(text_key(value), []).append(row)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _add(self, row: int, value: Any) -> None:
+        text = text_key(value)
+        rows = self._rows.get(text)
+        if rows is None:
+            self._rows[text] = [row]
+            if self._texts is not None:
+                insort(self._texts, text)
+
+        elif rows[-1] < row:
+            rows.append(row)
+
+        else:
+            insort(rows, row)
+
+    def _remove(self, row: int, value: Any) -> None:
+        text = text_key(value)
+        rows = self._rows[text]
+        rows.pop(bisect_left(rows, row))
+        if not rows:
+            del self._rows[text]
+            if self._texts is not None:
+                self._texts.pop(bisect_left(self._texts, text))
+
+    def append(self, value: Any) -> None:
+        self._values.append(value)
+        self._add(len(self._values) - 1, value)
+        self._order = None
+
+    def set(self, row: int, value: Any) -> None:
+        self._remove(row, self._values[row])
+        self._values[row] = value
+        self._add(row, value)
+        self._order = None
+
+    def key(self, row: int) -> Tuple:
+        return sort_key(self._values[row])
+
+    def equal(self, text: str) -> List[int]:
+        """Rows where the text of the value equals text, ignoring case."""
+        return list(self._rows.get(text_key(text), []))
+
+    def prefix(self, text: str) -> List[int]:
+        """Rows where the text of the value starts with text, ignoring case."""
+        if self._texts is None:
+            self._texts = sorted(self._rows.keys())
+
+        text = text_key(text)
+        matches = []
+        for position in range(bisect_left(self._texts, text), len(self._texts)):
+            if not self._texts[position].startswith(text):
+                break
+            matches.append(self._rows[self._texts[position]])
+
+        if len(matches) == 1:
+            return list(matches[0])
+
+        return sorted(row for rows in matches for row in rows)
+
+    def order(self, descending: bool = False) -> List[int]:
+        """All rows sorted by value. Equal values keep their row order."""
+        if self._order is None:
+            self._order = sorted(range(len(self._values)), key=self.key)
+
+        if descending:
+            return sorted(self._order, key=self.key, reverse=True)
+
+        return list(self._order)
+
+
+class RecordIndex:
+    """Column indexes of a list of records, created when first used. The
+    value function returns the value of a row and column name."""
+    def __init__(self, value: Callable[[int, str], Any], length: Callable[[], int]):
+        self._value = value
+        self._length = length
+        self._columns: Dict[str, ColumnIndex] = {}
+
+    def column(self, name: str) -> ColumnIndex:
+        try:
+            return self._columns[name]
+        except KeyError:
+            pass
+
+        index = ColumnIndex([self._value(row, name) for row in range(self._length())])
+        self._columns[name] = index
+
+        return index
+
+    def append(self) -> None:
+        """Add the rows added at the end since the index was last updated."""
+        for name, index in self._columns.items():
+            for row in range(len(index), self._length()):
+                index.append(self._value(row, name))
+
+    def update(self, row: int) -> None:
+        """Refresh the values of a changed row."""
+        for name, index in self._columns.items():
+            index.set(row, self._value(row, name))
+
+    def update_rows(self, rows: Collection[int], name: Optional[str] = None) -> None:
+        """Refresh many changed rows. Indexes are dropped, to be built again
+        when used, if a large part of their rows changed."""
+        for column, index in list(self._columns.items()):
+            if name is not None and column != name:
+                continue
+
+            if len(rows) * REBUILD_FRACTION > len(index):
+                del self._columns[column]
+                continue
+
+            for row in rows:
+                index.set(row, self._value(row, column))
+
+    def clear(self) -> None:
+        self._columns = {}
+
+    def equal(self, name: str, text: str) -> List[int]:
+        return self.column(name).equal(text)
+
+    def prefix(self, name: str, text: str) -> List[int]:
+        return self.column(name).prefix(text)
+
+    def order(self, name: str, rows: Optional[List[int]] = None, descending: bool = False) -> List[int]:
+        """Rows sorted by the values of a column. Sorts the given rows only,
+        or all rows."""
+        index = self.column(name)
+        if rows is None:
+            return index.order(descending)
+
+        return sorted(rows, key=index.key, reverse=descending)
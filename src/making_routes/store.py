@@ -0,0 +1,414 @@
+"""
+Qt free storage of records, used when running without a user interface.
+"""
+from array import array
+from collections.abc import MutableSequence
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Type, Union
+
+from many_more_routes.ducks import OutputRecord
+
+from pydantic import BaseModel
+
+from .dedup import Deduplicator
+from .report import REPORT_API, ErrorReport, Issue, split_replacements
+
+
+class Rows(NamedTuple):
+    """The records at positions start to stop of the view of an api. An
+    empty range is the position to insert new records at."""
+    api: str
+    start: int
+    stop: int
+
+
+# Groups of (old, new), old given as Rows and Issues, new as records and Issues
+Replacements = Sequence[Tuple[Sequence[Any], Sequence[Any]]]
+
+# Groups of (old, new) of a single api, without issues
+Splices = Sequence[Tuple[Sequence[Rows], Sequence[OutputRecord]]]
+
+
+def splice_records(data: Sequence[Any], replacements: Splices) -> List[Any]:
+    """Returns a copy of data where the rows of each (old, new) group are
+    replaced by the new records, at the position of its first rows. All
+    positions refer to data before any replacement. Groups without rows are
+    added at the end."""
+    cuts = []
+    added = []
+    for n, (old, new) in enumerate(replacements):
+        if not old:
+            added.extend(new)
+            continue
+
+        ranges = sorted((rows.start, rows.stop) for rows in old)
+        cuts.append((*ranges[0], n, new))
+        cuts.extend((start, stop, n, ()) for start, stop in ranges[1:])
+
+    spliced = []
+    position = 0
+    for start, stop, n, new in sorted(cuts, key=lambda cut: (cut[0], cut[2])):
+        if start < position or stop > len(data):
+            raise ValueError(f"Rows {start}:{stop} overlap other rows or are outside {len(data)} records")
+
+        spliced.extend(data[position:start])
+        spliced.extend(new)
+        position = stop
+
+    spliced.extend(data[position:])
+    spliced.extend(added)
+
+    return spliced
+
+
+class CompactRecords(MutableSequence):
+    """List of records stored as tuples of field values. Records of the model
+    type of the list are packed when added and materialized with construct
+    when read, other records are kept as they are. The model type is taken
+    from the first pydantic record when not given."""
+    def __init__(self, records: Iterable[OutputRecord] = (), model: Optional[Type[BaseModel]] = None):
+        self._model: Optional[Type[BaseModel]] = None
+        self._fields: Tuple[str, ...] = ()
+        self._positions: Dict[str, int] = {}
+        self._rows: List[Any] = []
+
+        if model is not None:
+            self._set_model(model)
+
+        self.extend(records)
+
+    def _set_model(self, model: Type[BaseModel]) -> None:
+        self._model = model
+        self._fields = tuple(model.__fields__.keys())
+        self._positions = {name: position for position, name in enumerate(self._fields)}
+
+    def _pack(self, record: OutputRecord) -> Any:
+        if self._model is None and isinstance(record, BaseModel):
+            self._set_model(type(record))
+
+        if type(record) is not self._model:
+            return record
+
+        values = record.__dict__
+        return tuple(values.get(name) for name in self._fields)
+
+    def _unpack(self, row: Any) -> OutputRecord:
+        if type(row) is not tuple:
+            return row
+
+        return self._model.construct(**dict(zip(self._fields, row)))
+
+    @classmethod
+    def from_rows(cls, model: Optional[Type[BaseModel]], rows: List[Any]) -> 'CompactRecords':
+        """Records from rows as returned by the rows property."""
+        records = cls(model=model)
+        records._rows = rows
+        return records
+
+    @property
+    def model(self) -> Optional[Type[BaseModel]]:
+        return self._model
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return self._fields
+
+    @property
+    def rows(self) -> List[Any]:
+        """The stored rows, tuples of field values or records."""
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[OutputRecord, List[OutputRecord]]:
+        if isinstance(index, slice):
+            return [self._unpack(row) for row in self._rows[index]]
+
+        return self._unpack(self._rows[index])
+
+    def __setitem__(self, index: Union[int, slice], record: Union[OutputRecord, Iterable[OutputRecord]]) -> None:
+        if isinstance(index, slice):
+            self._rows[index] = [self._pack(item) for item in record]
+        else:
+            self._rows[index] = self._pack(record)
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        del self._rows[index]
+
+    def __iter__(self) -> Iterator[OutputRecord]:
+        for row in self._rows:
+            yield self._unpack(row)
+
+    def insert(self, index: int, record: OutputRecord) -> None:
+        self._rows.insert(index, self._pack(record))
+
+    def extend(self, records: Iterable[OutputRecord]) -> None:
+        self._rows.extend(self._pack(record) for record in records)
+
+    def copy(self) -> List[OutputRecord]:
+        """Materialized list of the records."""
+        return list(self)
+
+    def value(self, index: int, name: str) -> Any:
+        """A single field of a record, without materializing it."""
+        row = self._rows[index]
+        if type(row) is not tuple:
+            return getattr(row, name)
+
+        try:
+            return row[self._positions[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def values(self, name: str) -> List[Any]:
+        """A field of every record, None where a record has no such field."""
+        position = self._positions.get(name)
+        return [
+            (row[position] if position is not None else None) if type(row) is tuple else getattr(row, name, None)
+            for row in self._rows
+        ]
+
+    def tuples(self) -> Iterator[Tuple]:
+        """Field values of every record, in field order."""
+        for row in self._rows:
+            yield row if type(row) is tuple else tuple(row.dict().values())
+
+    def set_value(self, index: int, name: str, value: Any) -> None:
+        """Set a single field of a record, without materializing it."""
+        row = self._rows[index]
+        position = self._positions.get(name)
+        if type(row) is tuple and position is not None:
+            self._rows[index] = row[:position] + (value,) + row[position + 1:]
+        else:
+            record = self._unpack(row).copy()
+            setattr(record, name, value)
+            self._rows[index] = self._pack(record)
+
+    def splice(self, replacements: Splices) -> 'CompactRecords':
+        """Like splice_records, packing the new records."""
+        packed = [(old, [self._pack(record) for record in new]) for old, new in replacements]
+
+        return CompactRecords.from_rows(self._model, splice_records(self._rows, packed))
+
+
+def field_values(records: Sequence[OutputRecord], name: str) -> List[Any]:
+    """A field of every record, None where a record has no such field."""
+    if isinstance(records, CompactRecords):
+        return records.values(name)
+
+    return [getattr(record, name, None) for record in records]
+
+
+def record_values(records: Sequence[OutputRecord]) -> Iterator[Tuple]:
+    """Field values of every record, in field order."""
+    if isinstance(records, CompactRecords):
+        return records.tuples()
+
+    return (tuple(record.dict().values()) for record in records)
+
+
+def set_field_values(records: Sequence[OutputRecord], name: str, values: Dict[int, Any]) -> None:
+    """Set a field of the records at the given indexes. Changed records
+    are replaced by changed copies, so snapshots keep the old ones."""
+    if isinstance(records, CompactRecords):
+        for index, value in values.items():
+            records.set_value(index, name, value)
+    else:
+        for index, value in values.items():
+            record = records[index].copy()
+            setattr(record, name, value)
+            records[index] = record
+
+
+def snapshot(records: Sequence[OutputRecord]) -> Sequence[OutputRecord]:
+    """The records as they are now, for reading on another thread while the
+    storage is changed. Only the list of rows or records is copied."""
+    if isinstance(records, CompactRecords):
+        return CompactRecords.from_rows(records.model, list(records.rows))
+
+    return list(records)
+
+
+def group_replacements(replacements: Replacements) -> Dict[str, List[Tuple[List[Rows], List[OutputRecord]]]]:
+    """Split (old, new) groups without issues per api."""
+    grouped: Dict[str, List[Tuple[List[Rows], List[OutputRecord]]]] = {}
+    for old, new in replacements:
+        per_api: Dict[str, Tuple[List[Rows], List[OutputRecord]]] = {}
+        for rows in old:
+            per_api.setdefault(rows.api, ([], []))[0].append(rows)
+        for record in new:
+            per_api.setdefault(record._api, ([], []))[1].append(record)
+
+        for api, group in per_api.items():
+            grouped.setdefault(api, []).append(group)
+
+    return grouped
+
+
+class Provenance:
+    """Positions of the outputs made from each template row. The outputs of
+    a row follow those of the rows before it in the view of their api, so
+    only their number per api is kept and the positions are counted from
+    the start of the views. Issues are kept as they are."""
+    def __init__(self):
+        self.rows = 0
+        self.counts: Dict[str, array] = {}
+        self.issues: Dict[int, List[Issue]] = {}
+
+    def _counts(self, api: str) -> array:
+        try:
+            return self.counts[api]
+        except KeyError:
+            counts = self.counts[api] = array('l', [0]) * self.rows
+            return counts
+
+    def _set(self, index: int, results: Iterable[Any]) -> None:
+        for counts in self.counts.values():
+            counts[index] = 0
+        self.issues.pop(index, None)
+
+        for result in results:
+            if isinstance(result, Issue):
+                self.issues.setdefault(index, []).append(result)
+            else:
+                self._counts(result._api)[index] += 1
+
+    def _grow(self, rows: int) -> None:
+        for counts in self.counts.values():
+            counts.extend([0] * (rows - self.rows))
+        self.rows = max(self.rows, rows)
+
+    def append(self, results: Iterable[Any]) -> None:
+        """Keep the results of the next template row."""
+        self._grow(self.rows + 1)
+        self._set(self.rows - 1, results)
+
+    def totals(self) -> Dict[str, int]:
+        """Number of outputs per api."""
+        return {api: sum(counts) for api, counts in self.counts.items()}
+
+    def replacements(self, results: Dict[int, Sequence[Any]]) -> List[Tuple[List[Any], List[Any]]]:
+        """(old, new) groups replacing the outputs of template rows with new
+        results, the old outputs given by position. The kept counts are
+        changed to the new results."""
+        if results:
+            self._grow(max(results) + 1)
+
+        for records in results.values():
+            for record in records:
+                if not isinstance(record, Issue):
+                    self._counts(record._api)
+
+        replacements = []
+        offsets = dict.fromkeys(self.counts, 0)
+        previous = 0
+        for index in sorted(results):
+            old = list(self.issues.get(index, []))
+            for api, counts in self.counts.items():
+                offsets[api] += sum(counts[previous:index])
+                old.append(Rows(api, offsets[api], offsets[api] + counts[index]))
+
+            previous = index
+            replacements.append((old, list(results[index])))
+
+        for index, records in results.items():
+            self._set(index, records)
+
+        return replacements
+
+
+class RecordStore:
+    """Keeps lists of records per api. Mirrors the ModelViewController
+    without creating any views. With compact set the records are kept in
+    CompactRecords instead of lists. With a deduplicator appended records
+    are passed through it first. Issues are kept in the error report."""
+    def __init__(self, compact: bool = False, dedup: Optional[Deduplicator] = None):
+        self.compact = compact
+        self.dedup = dedup
+        self.views: Dict[str, List[OutputRecord]] = {}
+        self.protected: Set[str] = set()
+        self.report = ErrorReport()
+
+    def append_record(self, record: OutputRecord) -> None:
+        self.append_records([record])
+
+    def append_records(self, records: Iterable[OutputRecord]) -> None:
+        if self.dedup is not None:
+            records = self.dedup.filter(records)
+
+        issues = []
+        for record in records:
+            if isinstance(record, Issue):
+                issues.append(record)
+                continue
+
+            try:
+                self.views[record._api].append(record)
+            except KeyError:
+                self.views[record._api] = CompactRecords([record]) if self.compact else [record]
+
+        self.report.add(issues)
+
+    def replace_records(self, replacements: Replacements) -> None:
+        replacements, old, new = split_replacements(replacements)
+        self.report.replace(old, new)
+
+        # validation issues point at rows of the records being replaced
+        groups_by_api = group_replacements(replacements)
+        self.report.clear('VALIDATION_ERROR', groups_by_api.keys())
+
+        for api, groups in groups_by_api.items():
+            view = self.views.get(api)
+            if isinstance(view, CompactRecords):
+                self.views[api] = view.splice(groups)
+            else:
+                self.views[api] = splice_records(view or [], groups)
+
+    def set_view(self, name: str, records: Sequence[OutputRecord]) -> None:
+        """Replace the records of a view."""
+        if self.dedup is not None:
+            self.dedup.forget([name])
+
+        if self.compact:
+            self.views[name] = records if isinstance(records, CompactRecords) else CompactRecords(records)
+        else:
+            self.views[name] = list(records)
+
+    def update_values(self, api: str, name: str, values: Dict[int, Any]) -> None:
+        set_field_values(self.views[api], name, values)
+
+    def protect(self, name: str) -> None:
+        if not name in self.views.keys():
+            raise LookupError(f"No view exists for {name}.")
+
+        self.protected.add(name)
+
+    def get_view(self, name: str) -> List[OutputRecord]:
+        return self.views[name]
+
+    def clear(self, force: bool = False):
+        if not force:
+            keys = list(self.views.keys())
+            for key in keys:
+                if key not in self.protected:
+                    self.views.pop(key)
+                    if self.dedup is not None:
+                        self.dedup.forget([key])
+        else:
+            self.views = {}
+            self.protected = set()
+            if self.dedup is not None:
+                self.dedup.clear()
+
+        self.report.clear()
+
+    def update_report(self) -> None:
+        """Replace the ERROR_REPORT view with a summary of the report."""
+        summary = self.report.summary()
+        if summary:
+            self.set_view(REPORT_API, summary)
+        else:
+            self.views.pop(REPORT_API, None)
+
+    def counts(self) -> Dict[str, int]:
+        return {name: len(records) for name, records in self.views.items()}
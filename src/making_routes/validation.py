@@ -0,0 +1,109 @@
+"""
+Single pass validation of records, with a cache of the validation errors
+keyed by record type and content.
+"""
+import threading
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic import validate_model
+
+CACHE_SIZE = 500000
+
+
+class ValidationCache:
+    """Least recently used cache of validation errors. Safe to use from the
+    GUI thread and a worker thread at the same time."""
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._errors: OrderedDict[Hashable, List[Dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[List[Dict]]:
+        with self._lock:
+            try:
+                errors = self._errors[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            self._errors.move_to_end(key)
+            self.hits += 1
+            return errors
+
+    def put(self, key: Hashable, errors: List[Dict]) -> None:
+        with self._lock:
+            self._errors[key] = errors
+            self._errors.move_to_end(key)
+
+            while len(self._errors) > self.maxsize:
+                self._errors.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._errors.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._errors),
+            'maxsize': self.maxsize
+        }
+
+
+cache = ValidationCache()
+
+
+def content_key(record: BaseModel) -> Hashable:
+    """Key identifying the type and content of a record."""
+    values = tuple(record.__dict__.values())
+    try:
+        hash(values)
+    except TypeError:
+        values = repr(values)
+
+    return type(record), values
+
+
+def validate(model: Type[BaseModel], data: Dict[Any, Any], fallback: Optional[Type[BaseModel]] = None) -> Tuple[BaseModel, List[Dict]]:
+    """Validate data against the model in a single pass. Fields that fail are
+    coerced with the same field of the fallback model when given, and kept as
+    they are otherwise. Returns the record and its validation errors, which are
+    stored in the cache."""
+    values, fields_set, error = validate_model(model, data)
+
+    if error is None:
+        record = model.construct(_fields_set=fields_set, **values)
+        cache.put(content_key(record), [])
+        return record, []
+
+    for name in model.__fields__.keys() - values.keys():
+        value = data.get(name)
+        if fallback is not None and name in fallback.__fields__:
+            coerced, field_error = fallback.__fields__[name].validate(value, {}, loc=name, cls=fallback)
+            if not field_error:
+                value = coerced
+        values[name] = value
+
+    record = model.construct(_fields_set=fields_set, **{name: values[name] for name in model.__fields__})
+    errors = error.errors()
+    cache.put(content_key(record), errors)
+
+    return record, errors
+
+
+def errors(record: BaseModel) -> List[Dict]:
+    """Validation errors of a record. Only records not found in the cache
+    are validated."""
+    cached = cache.get(content_key(record))
+    if cached is not None:
+        return cached
+
+    return validate(type(record), record.dict())[1]
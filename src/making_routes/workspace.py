@@ -0,0 +1,277 @@
+"""
+Binary workspace files with every view of a session, so a processed template
+can be opened again without loading, validating and processing it.
+
+A workspace starts with a fixed header, followed by one pickled list of rows
+per view, the pickled issues of the error report and a json manifest
+describing them:
+
+    b'MRWS'  format version (uint32)  manifest offset (uint64)
+    rows of each view ...
+    issues
+    manifest
+
+Rows of the model of a view are tuples of field values, other records are
+written as dicts with their model and field values. The pickles only hold
+plain values, and are read with an unpickler that refuses any other class.
+Models are looked up among the models of many_more_routes.models and
+making_routes.records, never imported by name, so opening a workspace can
+not run code from it.
+
+The file is memory mapped when read, the rows of a view are only decoded
+when the view is loaded.
+"""
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Type, Union
+
+from pydantic import BaseModel
+
+from many_more_routes import models as output_models
+from many_more_routes.ducks import OutputRecord
+from many_more_routes.models import ValidatedTemplate
+
+from . import records as record_models
+from .records import template_record
+from .report import Issue
+from .store import CompactRecords
+
+SUFFIX = '.mrws'
+MAGIC = b'MRWS'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<4sIQ')
+
+SAFE_CLASSES = {
+    ('builtins', 'set'),
+    ('builtins', 'frozenset'),
+    ('builtins', 'bytearray'),
+    ('builtins', 'complex'),
+    ('datetime', 'date'),
+    ('datetime', 'datetime'),
+    ('datetime', 'time'),
+    ('datetime', 'timedelta'),
+    ('datetime', 'timezone'),
+    ('decimal', 'Decimal'),
+}
+
+
+class WorkspaceError(ValueError):
+    """
+    Raised when a file is not a workspace or can not be read.
+    """
+
+
+def library_version() -> str:
+    try:
+        from importlib import metadata as importlib_metadata
+    except ImportError:
+        # Backwards compatibility - importlib.metadata was added in Python 3.8
+        import importlib_metadata
+
+    try:
+        return importlib_metadata.version('many_more_routes')
+    except importlib_metadata.PackageNotFoundError:
+        return ''
+
+
+def model_path(model: Optional[Type[BaseModel]]) -> Optional[str]:
+    return None if model is None else f'{model.__module__}:{model.__qualname__}'
+
+
+class SafeUnpickler(pickle.Unpickler):
+    """Unpickles plain values only."""
+    def find_class(self, module: str, name: str) -> Any:
+        if (module, name) not in SAFE_CLASSES:
+            raise WorkspaceError(f'Workspace holds a {module}.{name}, only plain values are read')
+
+        return super().find_class(module, name)
+
+
+def safe_loads(data: bytes) -> Any:
+    try:
+        return SafeUnpickler(io.BytesIO(data)).load()
+    except WorkspaceError:
+        raise
+    except Exception as error:
+        raise WorkspaceError(f'Workspace data can not be read: {error}') from error
+
+
+@lru_cache(maxsize=None)
+def known_models() -> Dict[str, Type[BaseModel]]:
+    """The models a workspace may refer to, by model_path."""
+    return {
+        model_path(value): value
+        for module in (output_models, record_models)
+        for value in vars(module).values()
+        if isinstance(value, type) and issubclass(value, BaseModel) and value.__module__ == module.__name__
+    }
+
+
+def find_model(path: Optional[str]) -> Optional[Type[BaseModel]]:
+    """The known model of a path, None for other paths."""
+    return None if path is None else known_models().get(path)
+
+
+def row_dict(record: OutputRecord) -> Dict[str, Any]:
+    """A record that is not of the model of its view, as plain values."""
+    return {'model': model_path(type(record)), 'values': record.dict()}
+
+
+def row_record(row: Dict[str, Any]) -> OutputRecord:
+    model = find_model(row['model'])
+    if model is None:
+        raise WorkspaceError(f'Model {row["model"]} of a workspace record is not known')
+
+    return model.construct(**row['values'])
+
+
+def save_workspace(
+    views: Mapping[str, Sequence[OutputRecord]],
+    protected: Set[str],
+    path: Union[str, Path],
+    issues: Sequence[Issue] = ()
+) -> None:
+    """Write the views and the issues of their error report to a workspace
+    file. The file is replaced only once it is completely written."""
+    path = Path(path)
+    temporary = path.with_name(path.name + '.tmp')
+    manifest: Dict[str, Any] = {
+        'format': FORMAT_VERSION,
+        'many_more_routes': library_version(),
+        'views': [],
+    }
+
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+
+        for name, records in views.items():
+            if not isinstance(records, CompactRecords):
+                records = CompactRecords(records)
+
+            offset = file.tell()
+            rows = [row if type(row) is tuple else row_dict(row) for row in records.rows]
+            pickle.dump(rows, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+            manifest['views'].append({
+                'name': name,
+                'model': model_path(records.model),
+                'fields': list(records.fields),
+                'rows': len(records),
+                'offset': offset,
+                'length': file.tell() - offset,
+                'protected': name in protected,
+            })
+
+        offset = file.tell()
+        pickle.dump([tuple(issue) for issue in issues], file, protocol=pickle.HIGHEST_PROTOCOL)
+        manifest['issues'] = {
+            'count': len(issues),
+            'offset': offset,
+            'length': file.tell() - offset,
+        }
+
+        offset = file.tell()
+        file.write(json.dumps(manifest).encode('utf-8'))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, offset))
+
+    os.replace(temporary, path)
+
+
+class Workspace:
+    """An open workspace file. Views are decoded when loaded."""
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, offset = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise WorkspaceError(f'"{self.path}" is not a workspace')
+
+            if version != FORMAT_VERSION:
+                raise WorkspaceError(f'Workspace format {version} is not supported, expected {FORMAT_VERSION}')
+
+            self.manifest = json.loads(self._map[offset:].decode('utf-8'))
+
+        except WorkspaceError:
+            self.close()
+            raise
+
+        except (ValueError, struct.error) as error:
+            self.close()
+            raise WorkspaceError(f'"{self.path}" is not a workspace') from error
+
+        self._views = {view['name']: view for view in self.manifest['views']}
+
+    def __enter__(self) -> 'Workspace':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._views.keys())
+
+    @property
+    def protected(self) -> Set[str]:
+        return {name for name, view in self._views.items() if view['protected']}
+
+    @property
+    def stale(self) -> bool:
+        """True when the workspace was written with another version of
+        many_more_routes, a model is not known or has changed fields since. The views
+        should then be made again from the template."""
+        if self.manifest['many_more_routes'] != library_version():
+            return True
+
+        for view in self._views.values():
+            model = find_model(view['model'])
+            if view['model'] is not None and (model is None or list(model.__fields__.keys()) != view['fields']):
+                return True
+
+        return False
+
+    def _decode(self, section: Dict[str, Any]) -> Any:
+        return safe_loads(self._map[section['offset']:section['offset'] + section['length']])
+
+    def rows(self, name: str) -> List[Any]:
+        """The rows of a view, tuples of field values or records."""
+        return [row if type(row) is tuple else row_record(row) for row in self._decode(self._views[name])]
+
+    def issues(self) -> List[Issue]:
+        """The issues of the error report, none for workspaces written
+        without them."""
+        if 'issues' not in self.manifest:
+            return []
+
+        return [Issue(*values) for values in self._decode(self.manifest['issues'])]
+
+    def load(self, name: str) -> CompactRecords:
+        """The records of a view, as written."""
+        return CompactRecords.from_rows(find_model(self._views[name]['model']), self.rows(name))
+
+    def template_records(self, name: str = 'TEMPLATE_V3') -> Iterator[ValidatedTemplate]:
+        """The template rows validated again with the current models, for
+        when the workspace is stale."""
+        fields = self._views[name]['fields']
+        for row in self._decode(self._views[name]):
+            if type(row) is tuple:
+                yield template_record(dict(zip(fields, row)))
+            else:
+                yield template_record(row['values'])
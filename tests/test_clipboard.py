@@ -0,0 +1,17 @@
+"""
+Tab separated text as copied from spreadsheets.
+"""
+from making_routes.clipboard import format_table, parse_table
+
+
+def test_parse_table_keeps_empty_cells_of_a_column():
+    assert parse_table('A1\n\nA3\n') == [['A1'], [''], ['A3']]
+    assert parse_table('A1\r\n\r\n') == [['A1'], ['']]
+    assert parse_table('\n') == [['']]
+    assert parse_table('') == []
+
+
+def test_parse_table_reads_formatted_tables():
+    rows = [['a', None, 'line\nbreak'], ['tab\tbed', 1, '']]
+
+    assert parse_table(format_table(rows)) == [['a', '', 'line\nbreak'], ['tab\tbed', '1', '']]
@@ -0,0 +1,59 @@
+"""
+Editing cells of a table: setting, pasting, filling down and undoing.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('PySide6')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtCore import QItemSelectionModel
+from PySide6.QtWidgets import QApplication
+
+from making_routes.models import OutputRecordView
+
+from test_store import selection
+
+
+@pytest.fixture
+def view():
+    app = QApplication.instance() or QApplication([])
+    view = OutputRecordView([selection(name) for name in 'ABCD'], editable=True)
+    yield view
+    view.deleteLater()
+
+
+def select(view: OutputRecordView, rows, name: str = 'OBV1') -> None:
+    column = view.model._columns.index(name)
+    for row in rows:
+        view.selectionModel().select(view.model.index(row, column), QItemSelectionModel.Select)
+
+
+def values(view: OutputRecordView):
+    return [view.model._value(row, 'OBV1') for row in range(4)]
+
+
+def test_paste_keeps_empty_cells_in_place(view):
+    select(view, [0])
+
+    assert view.paste('X\n\nZ\n') == 3
+    assert values(view) == ['X', None, 'Z', 'D']
+
+
+def test_fill_down_and_undo(view):
+    select(view, [1, 2, 3])
+
+    assert view.fill_down() == 2
+    assert values(view) == ['A', 'B', 'B', 'B']
+
+    view.model.undo()
+    assert values(view) == ['A', 'B', 'C', 'D']
+
+
+def test_set_cells_clears_empty_strings_in_one_step(view):
+    assert view.model.set_cells({(1, 'OBV1'): 'Y', (2, 'OBV1'): ''}) == 2
+    assert values(view) == ['A', 'Y', None, 'D']
+
+    view.model.undo()
+    assert values(view) == ['A', 'B', 'C', 'D']
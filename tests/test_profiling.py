@@ -0,0 +1,34 @@
+"""
+Measurements nested in a profiled callback, on its thread and on others.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from making_routes.profiling import Profiler
+
+
+def test_nested_measurements_keep_the_outer_counts():
+    profiler = Profiler()
+
+    def trigger(name: str, records: int) -> None:
+        profiler.new_run()
+        with profiler.measure(name):
+            profiler.add(records)
+
+    def button() -> None:
+        profiler.add(1)
+        trigger('Inner', 2)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(trigger, ['Worker', 'Worker'], [3, 4]))
+        profiler.add(5)
+
+    profiler.profiled('Plugin.button', button)()
+
+    assert profiler.stats['Inner'].records == 2
+    assert profiler.stats['Worker'].records == 7
+    assert profiler.stats['Plugin.button'].records == 15
+    assert [measurement.name for measurement in profiler.recent] == ['Inner', 'Worker', 'Worker', 'Plugin.button']
+
+    profiler.profiled('Plugin.button', lambda: profiler.add(1))()
+
+    assert [measurement.name for measurement in profiler.recent] == ['Plugin.button']
+    assert profiler.stats['Plugin.button'].calls == 2
@@ -0,0 +1,44 @@
+"""
+Plugin discovery with plugins that fail to load.
+"""
+from making_routes.cli import HeadlessInterface
+from making_routes import registry as registry_module
+from making_routes.registry import BUILTIN_PLUGINS, PluginRegistry
+
+
+def test_broken_plugins_are_skipped_and_reported(tmp_path):
+    cache = tmp_path / 'plugins.json'
+    builtin = ['making_routes.plugins.core:MakeRoutePlugin', 'making_routes.plugins.core:Missing', 'no_such_module:Plugin']
+
+    registry = PluginRegistry(HeadlessInterface(), cache, builtin)
+
+    assert [entry.name for entry in registry.entries] == ['MakeRoutePlugin']
+    assert list(registry.errors) == builtin[1:]
+    assert not cache.exists()
+
+    registry = PluginRegistry(HeadlessInterface(), cache, BUILTIN_PLUGINS)
+
+    assert not registry.errors
+    assert cache.exists()
+
+
+def test_cached_manifest_is_used_until_the_plugins_change(tmp_path, monkeypatch):
+    cache = tmp_path / 'plugins.json'
+    builtin = ['making_routes.plugins.core:MakeRoutePlugin']
+    PluginRegistry(HeadlessInterface(), cache, builtin)
+
+    def fail(builtin):
+        raise AssertionError('discovered with a cached manifest')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(registry_module, 'discover', fail)
+        registry = PluginRegistry(HeadlessInterface(), cache, builtin)
+
+    assert [entry.name for entry in registry.entries] == ['MakeRoutePlugin']
+    assert not registry.loaded
+    assert not registry.update()
+
+    registry.builtin = builtin + ['making_routes.plugins.core:ValidatePlugin']
+    assert registry.update()
+    assert [entry.name for entry in registry.entries] == ['MakeRoutePlugin', 'ValidatePlugin']
+    assert [entry.name for entry in PluginRegistry(HeadlessInterface(), cache, builtin).entries] == ['MakeRoutePlugin', 'ValidatePlugin']
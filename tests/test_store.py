@@ -0,0 +1,79 @@
+"""
+Replacing outputs by position, with template rows that make outputs of the
+same content.
+"""
+from pydantic import BaseModel
+from pydantic import PrivateAttr
+
+from making_routes.report import Issue
+from making_routes.store import CompactRecords, Provenance, RecordStore, Rows, set_field_values, snapshot, splice_records
+
+
+class Selection(BaseModel):
+    _api: str = PrivateAttr(default='API_DRS011MI_Add')
+    EDES: str
+    OBV1: str
+
+
+def selection(name: str = 'A') -> Selection:
+    return Selection(EDES='SE', OBV1=name)
+
+
+def test_compact_splice_keeps_rows_of_the_same_content():
+    records = CompactRecords([selection(), selection(), selection()])
+
+    spliced = records.splice([([Rows('API_DRS011MI_Add', 1, 2)], [selection('B')])])
+
+    assert [record.OBV1 for record in spliced] == ['A', 'B', 'A']
+
+
+def test_splice_records_by_position():
+    records = [selection(), selection(), selection(), selection()]
+    replacements = [
+        ([Rows('API_DRS011MI_Add', 3, 4)], [selection('D')]),
+        ([Rows('API_DRS011MI_Add', 1, 1)], [selection('B')]),
+        ([Rows('API_DRS011MI_Add', 0, 1)], []),
+        ([], [selection('E')]),
+    ]
+
+    spliced = splice_records(records, replacements)
+
+    assert [record.OBV1 for record in spliced] == ['B', 'A', 'A', 'D', 'E']
+
+
+def test_provenance_replaces_outputs_of_duplicate_rows():
+    for compact in (False, True):
+        store = RecordStore(compact=compact)
+        provenance = Provenance()
+        issue = Issue('PROCESSING_ERROR', 'TEMPLATE_V3', 2, None, None, 'MakeSelection.ValueError', 'failed')
+        for results in ([selection()], [selection()], [issue], [selection()]):
+            provenance.append(results)
+            store.append_records(results)
+
+        store.replace_records(provenance.replacements({1: [selection('B'), selection('C')], 2: [selection('D')]}))
+        assert [record.OBV1 for record in store.views['API_DRS011MI_Add']] == ['A', 'B', 'C', 'D', 'A']
+        assert store.report.counts() == {}
+
+        store.replace_records(provenance.replacements({0: [], 3: [selection('E')]}))
+        assert [record.OBV1 for record in store.views['API_DRS011MI_Add']] == ['B', 'C', 'D', 'E']
+        assert provenance.totals() == {'API_DRS011MI_Add': 4}
+
+
+def test_replacing_outputs_clears_their_validation_issues():
+    store = RecordStore()
+    store.append_records([selection(), selection(), Issue('VALIDATION_ERROR', 'API_DRS011MI_Add', 1, 'OBV1', 'A', 'type_error', 'invalid')])
+    store.append_records([Issue('VALIDATION_ERROR', 'API_DRS005MI_AddRoute', 0, 'ROUT', 'R', 'type_error', 'invalid')])
+
+    store.replace_records([([Rows('API_DRS011MI_Add', 0, 1)], [])])
+
+    assert [issue.api for issue in store.report.issues()] == ['API_DRS005MI_AddRoute']
+
+
+def test_snapshot_keeps_the_records_before_changes():
+    for records in ([selection(), selection()], CompactRecords([selection(), selection()])):
+        saved = snapshot(records)
+        set_field_values(records, 'OBV1', {0: 'B'})
+        records[1] = selection('C')
+
+        assert [record.OBV1 for record in saved] == ['A', 'A']
+        assert [record.OBV1 for record in records] == ['B', 'C']
@@ -0,0 +1,65 @@
+"""
+Workspace files written and read back.
+"""
+import os
+import pickle
+import sys
+
+import pytest
+
+from many_more_routes.models import Selection
+
+from making_routes.records import ErrorSummary
+from making_routes.report import Issue
+from making_routes.workspace import Workspace, WorkspaceError, safe_loads, save_workspace
+
+
+def selection(name: str = 'A') -> Selection:
+    return Selection.construct(EDES='SE', PREX=' 5', OBV1=name)
+
+
+def test_workspace_keeps_the_issues(tmp_path):
+    path = tmp_path / 'session.mrws'
+    issues = [
+        Issue('PROCESSING_ERROR', 'TEMPLATE_V3', 2, None, None, 'MakeSelection.ValueError', 'failed'),
+        Issue('VALIDATION_ERROR', 'API_DRS011MI_Add', 0, 'OBV1', 'A', 'value_error', 'invalid'),
+    ]
+
+    save_workspace({'API_DRS011MI_Add': [selection(), selection('B')]}, set(), path, issues)
+
+    with Workspace(path) as workspace:
+        assert [record.OBV1 for record in workspace.load('API_DRS011MI_Add')] == ['A', 'B']
+        assert workspace.issues() == issues
+
+
+def test_workspace_keeps_records_of_other_models(tmp_path):
+    path = tmp_path / 'session.mrws'
+    summary = ErrorSummary(kind='VALIDATION_ERROR', api='API_DRS011MI_Add', field='OBV1', code='value_error', message='invalid', count=1, row=0)
+
+    save_workspace({'API_DRS011MI_Add': [selection(), summary]}, set(), path)
+
+    with Workspace(path) as workspace:
+        assert workspace.load('API_DRS011MI_Add')[1] == summary
+
+
+def test_workspace_data_with_other_classes_is_refused():
+    with pytest.raises(WorkspaceError):
+        safe_loads(pickle.dumps([(os.system, ('true',))]))
+
+
+def test_workspace_models_are_not_imported(tmp_path, monkeypatch):
+    (tmp_path / 'planted.py').write_text('raise SystemExit("imported")\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = tmp_path / 'session.mrws'
+    summary = ErrorSummary(kind='VALIDATION_ERROR', api='API_DRS011MI_Add', field='OBV1', code='value_error', message='invalid', count=1, row=0)
+
+    save_workspace({'ERROR_REPORT': [summary], 'API_DRS011MI_Add': [selection(), summary]}, set(), path)
+    known = b'making_routes.records:ErrorSummary'
+    path.write_bytes(path.read_bytes().replace(known, b'planted:'.ljust(len(known), b'M')))
+
+    with Workspace(path) as workspace:
+        assert workspace.stale
+        with pytest.raises(WorkspaceError):
+            workspace.rows('API_DRS011MI_Add')
+
+    assert 'planted' not in sys.modules